@@ -0,0 +1,201 @@
+"""
+JWT authentication that does not load the user row on every request.
+
+Access tokens issued by `/api/token/` carry the handful of user attributes
+the API checks (`username`, `role`, `is_staff`, `is_superuser`, `is_active`)
+and the user's `token_version`, so the request user can be rebuilt from the
+claims alone. It is a real `User` instance with every other field deferred:
+reading one (say `email`) loads it from the database on first access, and
+`cached_user()` serves the full row from a short-lived cache for the few
+views that need it.
+
+Claims go stale when the user is edited, deactivated or deleted. Those
+writes move `User.token_version` on (see accounts/signals.py) and publish
+the new version in the `shared` cache, which every server process reads
+through a copy kept for a few seconds (backend/shared_cache.py). Claims are
+trusted only while the token's version matches the published one, so other
+processes stop trusting old tokens within those seconds. Anything else
+falls back to the database the old way: an older version, no entry (never
+published, or evicted), or the cache being unavailable. The lookup also
+re-publishes the version.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from backend import shared_cache
+from backend.replicas import primary
+from .models import User
+
+TOKEN_CLAIMS = ('username', 'role', 'is_staff', 'is_superuser', 'is_active')
+VERSION_CLAIM = 'ver'
+USER_CACHE_TIMEOUT = getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+# Tokens older than this have expired anyway.
+VERSION_TIMEOUT = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+
+def user_key(user_id, version):
+    return f'accounts:user:{user_id}:{version}'
+
+
+def version_key(user_id):
+    return f'accounts:token-version:{user_id}'
+
+
+def add_claims(token, user):
+    for claim in TOKEN_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[VERSION_CLAIM] = user.token_version
+    return token
+
+
+def principal(user_id, claims):
+    """A `User` built from token claims, with every other field deferred."""
+    # simplejwt stores the id claim as a string.
+    loaded = {'id': User._meta.pk.to_python(user_id), 'token_version': claims[VERSION_CLAIM]}
+    loaded.update((claim, claims[claim]) for claim in TOKEN_CLAIMS)
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in loaded]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [loaded[name] for name in fields])
+
+
+def cached_user(user):
+    """The full row of the request `user`, cached for USER_CACHE_TIMEOUT seconds."""
+    # Keyed by version, so an edit in any process stops this copy being read.
+    key = user_key(user.pk, user.token_version)
+    full = cache.get(key)
+    if full is None:
+        with primary():
+            full = User.objects.get(pk=user.pk)
+        cache.set(key, full, USER_CACHE_TIMEOUT)
+    return full
+
+
+def current_version(user_id):
+    """The published token version of `user_id`, or None when it cannot be read."""
+    try:
+        return shared_cache.get(version_key(user_id))
+    except Exception:
+        # An unavailable store only means looking the user up.
+        return None
+
+
+async def acurrent_version(user_id):
+    try:
+        return await shared_cache.aget(version_key(user_id))
+    except Exception:
+        return None
+
+
+def publish_version(user_id, version, replace=True):
+    """
+    Publish `version` for `user_id` (None withdraws it). `replace=False`
+    only fills a missing entry, so a lookup that read the row just before an
+    edit cannot overwrite the version the edit published.
+    """
+    try:
+        if version is None:
+            shared_cache.delete(version_key(user_id))
+        elif replace:
+            shared_cache.set_many({version_key(user_id): version}, VERSION_TIMEOUT)
+        else:
+            shared_cache.add(version_key(user_id), version, VERSION_TIMEOUT)
+    except Exception:
+        pass
+
+
+def invalidate_user(user_id):
+    """
+    Move `user_id` to a new token version, so tokens issued until now are
+    checked against the database; returns the new version (None once the
+    user is deleted).
+    """
+    users = User.objects.filter(pk=user_id)
+    # Versions follow the clock, so one saved back from a stale instance
+    # cannot be reached again by counting up from it.
+    now = time.time_ns() // 1000
+    users.update(token_version=Greatest(F('token_version') + 1, Value(now)))
+    version = users.values_list('token_version', flat=True).first()
+    transaction.on_commit(lambda: publish_version(user_id, version))
+    return version
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        return self.claims_user(validated_token) or self.database_user(validated_token)
+
+    def database_user(self, validated_token):
+        # The row may have just changed; a lagging replica may not have it yet.
+        with primary():
+            user = super().get_user(validated_token)
+        publish_version(user.pk, user.token_version, replace=False)
+        return user
+
+    def claims_user(self, validated_token):
+        """The user rebuilt from the token's claims, or None when they cannot be trusted."""
+        user_id = self.claimed_id(validated_token)
+        if user_id is None:
+            return None
+        return self.trusted(validated_token, user_id, current_version(user_id))
+
+    async def aclaims_user(self, validated_token):
+        user_id = self.claimed_id(validated_token)
+        if user_id is None:
+            return None
+        return self.trusted(validated_token, user_id, await acurrent_version(user_id))
+
+    def claimed_id(self, validated_token):
+        claims = (*TOKEN_CLAIMS, VERSION_CLAIM)
+        if any(claim not in validated_token for claim in claims):
+            # Tokens from before the claims were added.
+            return None
+        return validated_token.get(api_settings.USER_ID_CLAIM)
+
+    def trusted(self, validated_token, user_id, version):
+        if (version is None or validated_token[VERSION_CLAIM] != version
+                or not validated_token['is_active']):
+            return None
+        return principal(user_id, validated_token)
+
+
+def request_token(auth, request, token=None):
+    header = auth.get_header(request)
+    raw = auth.get_raw_token(header) if header else (token or '').encode() or None
+    return auth.get_validated_token(raw) if raw is not None else None
+
+
+def authenticate_request(request, token=None):
+    """
+    The user behind a plain Django request's Bearer header (or `token`),
+    for views outside DRF; None when missing or invalid.
+    """
+    auth = ClaimsJWTAuthentication()
+    try:
+        validated = request_token(auth, request, token)
+        return auth.get_user(validated) if validated is not None else None
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def aauthenticate_request(request, token=None):
+    """
+    `authenticate_request()` for async views. Only tokens whose claims
+    cannot be trusted cost a database lookup, made in a worker thread.
+    """
+    auth = ClaimsJWTAuthentication()
+    try:
+        validated = request_token(auth, request, token)
+        if validated is None:
+            return None
+        return (await auth.aclaims_user(validated)
+                or await sync_to_async(auth.database_user)(validated))
+    except (InvalidToken, AuthenticationFailed):
+        return None
@@ -10,6 +10,9 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     bio = models.TextField(blank=True)
+    # Moved on by every change to the user; tokens carry the value they were
+    # issued with (see accounts/authentication.py).
+    token_version = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -0,0 +1,24 @@
+"""
+Move the user's token version on whenever a user changes: profile edits,
+role changes, deactivation (admin or otherwise) and deletion. Tokens issued
+before then are checked against the database again. Writes through
+queryset.update() bypass this and must call `invalidate_user()` themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # New users hold no tokens yet; logins only touch last_login, which no
+    # claim depends on.
+    if created or raw or update_fields == frozenset({'last_login'}):
+        return
+    version = invalidate_user(instance.pk)
+    if version is not None:
+        # Or saving this instance again would write the old version back.
+        instance.token_version = version
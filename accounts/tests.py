@@ -0,0 +1,96 @@
+"""
+Tests for the claims-based JWT authentication: a token's claims are
+trusted only while its version is the published one, and a user change
+reaches every token issued before it, whatever the caches still hold.
+"""
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .authentication import current_version
+from .models import User
+
+
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='secret-pass', role='student')
+
+    def setUp(self):
+        for alias in ('default', 'local', 'shared'):
+            caches[alias].clear()
+
+    def token(self):
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'username': 'student', 'password': 'secret-pass'})
+        return response.data['access']
+
+    def get(self, token, url=None):
+        return self.token_client(token).get(url or reverse('profile'))
+
+    def queries(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, 200)
+        return ctx.captured_queries
+
+    def save_user(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.user, name, value)
+            self.user.save()
+
+    def token_client(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def user_queries(self, token):
+        return [q for q in self.queries(self.token_client(token)) if 'accounts_user' in q['sql']]
+
+    def test_authentication_costs_no_queries_once_the_version_is_published(self):
+        client = self.token_client(self.token())
+        # The first request looks the user up and publishes the version.
+        self.assertTrue(any('accounts_user' in q['sql'] for q in self.queries(client)))
+        self.assertEqual(current_version(self.user.pk), self.user.token_version)
+        forced = APIClient()
+        forced.force_authenticate(self.user)
+        self.queries(forced)
+        # Nothing beyond what the view itself runs, the version read included.
+        self.assertEqual(len(self.queries(client)), len(self.queries(forced)))
+
+    def test_deactivated_user_is_rejected_after_the_caches_are_lost(self):
+        token = self.token()
+        self.assertEqual(self.get(token).status_code, 200)
+        self.save_user(is_active=False)
+        self.assertEqual(self.get(token).status_code, 401)
+        # Losing the published version only means looking the user up.
+        for alias in ('local', 'shared'):
+            caches[alias].clear()
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_new_version_is_read_from_the_shared_store(self):
+        token = self.token()
+        self.assertEqual(self.get(token).status_code, 200)
+        self.save_user(is_active=False)
+        # As in another process, once its copy has expired.
+        caches['local'].clear()
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_changed_role_is_read_from_the_database(self):
+        token = self.token()
+        self.assertEqual(self.get(token).data['role'], 'student')
+        self.save_user(role='instructor')
+        self.assertTrue(self.user_queries(token))
+        self.assertEqual(self.get(token).data['role'], 'instructor')
+
+    def test_versions_only_move_forward(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.save_user(bio='first')
+        issued = self.user.token_version
+        # Saving a stale copy writes its old version back before moving on.
+        stale.save()
+        self.assertGreater(User.objects.get(pk=self.user.pk).token_version, issued)
@@ -1,6 +1,8 @@
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from backend.pagination import KeysetPagination
+from .authentication import cached_user
 from .models import User
 from .serializers import RegisterSerializer, UserSerializer
 
@@ -17,19 +19,26 @@ class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        # request.user only carries the token claims; the rest comes from cache.
+        serializer = UserSerializer(cached_user(request.user))
         return Response(serializer.data)
 
     def patch(self, request):
-        serializer = UserSerializer(request.user, data=request.data, partial=True)
+        user = User.objects.get(pk=request.user.pk)
+        serializer = UserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
 
+class UserPagination(KeysetPagination):
+    ordering = ('id',)
+
+
 class UserListView(generics.ListAPIView):
     """GET /api/accounts/users/ - List all users (admin only)"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = UserPagination
@@ -0,0 +1,9 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Reads on the event loop (courses/async_views.py); set to 0 to serve the
+# DRF views as under WSGI.
+os.environ.setdefault('LMS_ASYNC_READS', '1')
+
+application = get_asgi_application()
@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination shared by the API list views.
+"""
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a composite ordering.
+
+    DRF's CursorPagination only filters on the first ordering field and falls
+    back to OFFSET for ties. Here the cursor carries every ordering value, so
+    with a unique tie-breaker (`id`) as the last field each page is a plain
+    index range scan no matter how deep the client has paged.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset()` for async views: the page is read with the async ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The (unevaluated) slice holding the requested page plus one row."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._keyset_filter(ordering, current_position))
+        self.page_cursor = (offset, reverse, current_position)
+
+        # Fetch one extra row to know whether another page follows.
+        return queryset[offset:offset + self.page_size + 1]
+
+    def set_page(self, results):
+        (offset, reverse, current_position) = self.page_cursor
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _keyset_filter(self, ordering, position):
+        """Rows strictly after `position` in `ordering` (lexicographic compare)."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            clause = equal & Q(**{field + lookup: value})
+            condition = clause if not condition else condition | clause
+            equal &= Q(**{field: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            values.append(str(attr))
+        return json.dumps(values)
@@ -0,0 +1,159 @@
+"""
+Opt-in request instrumentation.
+
+With PERF_INSTRUMENTATION enabled, every request records its SQL through
+`connection.execute_wrapper`: query count, total SQL time, the slowest
+statement and repeated statement shapes (a strong N+1 hint). Results go out
+as a `Server-Timing` header and a JSON log line on the `backend.perf`
+logger, and feed rolling per-URL-name percentiles served at `/api/_perf/`.
+
+When the setting is off the middleware raises MiddlewareNotUsed, so Django
+drops it from the chain entirely.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger('backend.perf')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*(?:\?\s*,\s*)+\?\s*\)')
+
+
+def fingerprint(sql):
+    """Statement shape with literals and IN-lists collapsed, for duplicate detection."""
+    shape = _LITERALS.sub('?', sql.replace('%s', '?'))
+    return _IN_LISTS.sub('(?...)', shape)
+
+
+class QueryRecorder:
+    """`execute_wrapper` hook that times each statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = (0.0, '')
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql)
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold):
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class RouteStats:
+    """Rolling window of (duration, query count) samples per URL name."""
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.lock = threading.Lock()
+
+    def add(self, route, duration, queries):
+        with self.lock:
+            self.samples[route].append((duration, queries))
+
+    def summary(self):
+        with self.lock:
+            snapshot = {route: list(samples) for route, samples in self.samples.items()}
+        report = {}
+        for route, samples in sorted(snapshot.items()):
+            durations = sorted(duration for duration, _ in samples)
+            report[route] = {
+                'samples': len(samples),
+                'p50_ms': percentile(durations, 50),
+                'p95_ms': percentile(durations, 95),
+                'p99_ms': percentile(durations, 99),
+                'max_ms': round(durations[-1] * 1000, 2),
+                'avg_queries': round(sum(q for _, q in samples) / len(samples), 2),
+            }
+        return report
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+route_stats = RouteStats(getattr(settings, 'PERF_WINDOW', 500))
+
+
+class PerfMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, 'PERF_DUPLICATE_THRESHOLD', 3)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        # Streaming bodies run their queries after this point and are not counted.
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unresolved'
+        route_stats.add(route, elapsed, recorder.count)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.total * 1000:.2f};desc="{recorder.count} queries"',
+            f'db-slowest;dur={recorder.slowest[0] * 1000:.2f}',
+            f'total;dur={elapsed * 1000:.2f}',
+        ])
+
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+        log = logger.warning if duplicates else logger.info
+        log(json.dumps({
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 2),
+            'db_ms': round(recorder.total * 1000, 2),
+            'queries': recorder.count,
+            'slowest_ms': round(recorder.slowest[0] * 1000, 2),
+            'slowest_sql': recorder.slowest[1][:500],
+            'duplicates': [{'sql': shape[:300], 'count': n} for shape, n in duplicates],
+        }))
+        return response
+
+
+class PerfStatsView(APIView):
+    """GET /api/_perf/ - Rolling latency percentiles per URL name (admin only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': getattr(settings, 'PERF_INSTRUMENTATION', False),
+            'window': route_stats.window,
+            'routes': route_stats.summary(),
+        })
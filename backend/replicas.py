@@ -0,0 +1,166 @@
+"""
+Read replicas.
+
+The aliases listed in REPLICA_DATABASES serve the reads made while handling a
+safe-method request (GET, HEAD, OPTIONS); one replica is picked per request.
+Everything else goes to `default`: writes, every query of an unsafe request,
+management commands and anything outside a request.
+
+Replicas lag the primary, so some reads stay on `default` anyway:
+
+- a client that has just written (enrolled, submitted, graded, ...) is
+  pinned to `default` for REPLICA_PIN_SECONDS, by user id and by session,
+  so it reads its own writes. Pins live in the `shared` cache, read
+  directly rather than through a per-process copy, so the pin holds
+  whichever process serves the next request;
+- `?since=` delta-sync polls, whose watermark assumes an up-to-date read;
+- code wrapped in `primary()`, such as the response cache filling a miss
+  (a stale payload would be cached under the new version stamp).
+
+`manage.py snapshot_replica` copies a SQLite primary to a replica file, a
+stand-in replica for local testing; under the test runner the `replica`
+alias mirrors `default`.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# The replica alias reads go to, or None for `default`.
+_replica = ContextVar('replica', default=None)
+
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'REPLICA_DATABASES', ()))
+
+
+def pin_keys(request):
+    """
+    Cache keys identifying who sent `request`: the user in its Bearer token
+    and its session cookie. Both are read without touching the database.
+    """
+    from accounts.authentication import ClaimsJWTAuthentication, request_token
+
+    keys = []
+    try:
+        validated = request_token(ClaimsJWTAuthentication(), request, request.GET.get('token'))
+    except (InvalidToken, AuthenticationFailed):
+        validated = None
+    if validated is not None and api_settings.USER_ID_CLAIM in validated:
+        keys.append(f'replicas:pinned:user:{validated[api_settings.USER_ID_CLAIM]}')
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        keys.append(f'replicas:pinned:session:{session_key}')
+    return keys
+
+
+@contextmanager
+def primary():
+    """Read from `default` inside the block."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # The `shared` DatabaseCache must read what was just written to it.
+        if model._meta.app_label == 'django_cache':
+            return 'default'
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicitly: Django would otherwise write an instance back to the
+        # database it was read from.
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db in replica_aliases() else None
+
+
+class ReplicaMiddleware:
+    """Route the request's reads (see the module docstring) and pin users after writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = replica_aliases()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        keys = pin_keys(request)
+        token = _replica.set(self.replica_for(request, keys))
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        self.after(request, response, keys)
+        return response
+
+    async def __acall__(self, request):
+        keys = pin_keys(request)
+        token = _replica.set(await self.areplica_for(request, keys))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica.reset(token)
+        await self.aafter(request, response, keys)
+        return response
+
+    def replica_for(self, request, keys):
+        if not self.routable(request) or self.pinned(keys):
+            return None
+        return random.choice(self.replicas)
+
+    async def areplica_for(self, request, keys):
+        if not self.routable(request) or await self.apinned(keys):
+            return None
+        return random.choice(self.replicas)
+
+    def routable(self, request):
+        return request.method in SAFE_METHODS and 'since' not in request.GET
+
+    def pinned(self, keys):
+        try:
+            return bool(keys) and bool(caches['shared'].get_many(keys))
+        except Exception:
+            # Without the pins, reading from `default` is the safe choice.
+            return True
+
+    async def apinned(self, keys):
+        try:
+            return bool(keys) and bool(await caches['shared'].aget_many(keys))
+        except Exception:
+            return True
+
+    def pins(self, request, response, keys):
+        return bool(keys) and request.method not in SAFE_METHODS and response.status_code < 400
+
+    def after(self, request, response, keys):
+        if self.pins(request, response, keys):
+            caches['shared'].set_many(dict.fromkeys(keys, True), PIN_SECONDS)
+
+    async def aafter(self, request, response, keys):
+        if self.pins(request, response, keys):
+            await caches['shared'].aset_many(dict.fromkeys(keys, True), PIN_SECONDS)
@@ -1,6 +1,7 @@
 """
 Django settings for Mini LMS project.
 """
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.perf.PerfMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -37,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -58,13 +61,53 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
-
-DATABASES = {
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Database profiles, picked with LMS_DB_PROFILE. `production` (backend/sqlite/)
+# runs SQLite in WAL mode so readers never block the writer, fsyncs only at
+# checkpoints, waits up to 5 s for the write lock instead of failing,
+# memory-maps the file, keeps connections open across requests and takes the
+# write lock at BEGIN. See `manage.py stress_submissions` for the difference.
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'production': {
+        'ENGINE': 'backend.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,           # ms
+                'mmap_size': 256 * 1024 ** 2,   # bytes
+                'cache_size': -64 * 1024,       # KiB (negative = size, not pages)
+                'temp_store': 'MEMORY',
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
 }
+DATABASE_PROFILE = os.environ.get('LMS_DB_PROFILE', 'default')
+DATABASES = {'default': DATABASE_PROFILES[DATABASE_PROFILE]}
+
+# Read replicas (backend/replicas.py): add their aliases to DATABASES and
+# list them here. LMS_SQLITE_REPLICA=<path> adds a SQLite snapshot of the
+# primary (refreshed with `manage.py snapshot_replica`) for local testing;
+# the test runner mirrors it onto `default`.
+REPLICA_DATABASES = []
+if os.environ.get('LMS_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['LMS_SQLITE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append('replica')
+REPLICA_PIN_SECONDS = 10    # reads stay on `default` this long after a client writes
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -88,7 +131,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -100,7 +143,89 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
+}
+
+# Caches. `default` and `responses` may be local to each process: the
+# entries in them that could go stale are keyed by versions read from
+# `shared`. `responses` holds the serialized catalog reads
+# (courses/caching.py) and evicts by entry count.
+#
+# `shared` is read by every process and holds the users' token versions
+# (accounts/authentication.py) and the catalog version stamps
+# (courses/caching.py). It is a database table (`manage.py
+# createcachetable`) unless LMS_SHARED_CACHE_URL names a Redis server. A
+# missing entry costs a database lookup or a cache miss, never a stale
+# answer. Each process reads it through `local` (backend/shared_cache.py),
+# so a change made in one process reaches the others within its TIMEOUT.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms-default',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms-responses',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 2000, 'CULL_FREQUENCY': 4},
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms-local',
+        'TIMEOUT': 5,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'shared': {
+        'BACKEND': 'backend.shared_cache.DatabaseCache',
+        'LOCATION': 'lms_shared_cache',
+        'TIMEOUT': None,
+        # Rows are counted, to cull, on one write in COUNT_EVERY.
+        'OPTIONS': {'MAX_ENTRIES': 1000000, 'COUNT_EVERY': 1000},
+    },
 }
+if os.environ.get('LMS_SHARED_CACHE_URL'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['LMS_SHARED_CACHE_URL'],
+        'TIMEOUT': None,
+    }
+
+# Full user rows behind ProfileView are cached this long (seconds).
+USER_CACHE_TIMEOUT = 300
+
+# Serve the course, lesson, assignment and submission reads from the async
+# views in courses/async_views.py. backend/asgi.py turns this on; WSGI
+# deployments keep the DRF views.
+ASYNC_READ_VIEWS = os.environ.get('LMS_ASYNC_READS') == '1'
+
+# Lesson and submission bodies this long (characters) or longer are kept
+# compressed and deduplicated in the body store (courses/bodies.py), e.g.
+# 2000; None, the default, keeps every body inline. `manage.py move_bodies`
+# moves existing rows after turning it on.
+BODY_STORE_MIN_LENGTH = None
+
+# Fan-out for /api/courses/events/ (courses/events.py). The in-process broker
+# only reaches streams held by the same worker process.
+EVENTS_BROKER = 'courses.events.InProcessBroker'
 
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Request instrumentation (backend/perf.py): query counts, Server-Timing
+# headers and /api/_perf/. Off unless LMS_PERF_INSTRUMENTATION=1.
+PERF_INSTRUMENTATION = os.environ.get('LMS_PERF_INSTRUMENTATION') == '1'
+PERF_WINDOW = 500               # samples kept per URL name
+PERF_DUPLICATE_THRESHOLD = 3    # repeats of one statement shape flagged as N+1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'backend.perf': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,125 @@
+"""
+Reads of the `shared` cache through a per-process copy.
+
+Token versions (accounts/authentication.py) and catalog stamps
+(courses/caching.py) are read on almost every request. Whatever this
+process reads from `shared` is kept in the `local` cache for its TIMEOUT
+(a few seconds), so those reads cost no round trip to the shared store.
+Writes go to both, so this process sees its own at once; other processes
+see them when their copy expires.
+
+Without Redis, `shared` is the DatabaseCache below, which skips the
+table-wide COUNT(*) Django's runs before every write.
+"""
+import base64
+import itertools
+import pickle
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import DatabaseError, IntegrityError, connections, router, transaction
+from django.utils.timezone import now as tz_now
+
+
+class DatabaseCache(BaseDatabaseCache):
+    """
+    A DatabaseCache that counts its rows (to cull past MAX_ENTRIES) on one
+    write in COUNT_EVERY instead of on every one: the count reads the whole
+    table. Between counts the table may run past MAX_ENTRIES by that many
+    entries.
+    """
+
+    def __init__(self, table, params):
+        super().__init__(table, params)
+        self._count_every = params.get('OPTIONS', {}).get('COUNT_EVERY', 1000)
+        self._writes = itertools.count(1)
+
+    def _base_set(self, mode, key, value, timeout=DEFAULT_TIMEOUT):
+        if mode == 'touch' or next(self._writes) % self._count_every == 0:
+            return super()._base_set(mode, key, value, timeout)
+        timeout = self.get_backend_timeout(timeout)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        key_column, value_column, expires_column = map(quote_name, ('cache_key', 'value', 'expires'))
+        if timeout is None:
+            expires = datetime.max
+        else:
+            expires = datetime.fromtimestamp(timeout, tz=timezone.utc if settings.USE_TZ else None)
+        expires = connection.ops.adapt_datetimefield_value(expires.replace(microsecond=0))
+        now = connection.ops.adapt_datetimefield_value(tz_now().replace(microsecond=0))
+        encoded = base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1')
+        insert = (f'INSERT INTO {table} ({key_column}, {value_column}, {expires_column}) '
+                  'VALUES (%s, %s, %s)')
+        try:
+            with connection.cursor() as cursor, transaction.atomic(using=db):
+                if mode == 'add':
+                    # An expired entry does not block the add.
+                    cursor.execute(f'DELETE FROM {table} WHERE {key_column} = %s '
+                                   f'AND {expires_column} < %s', [key, now])
+                    try:
+                        with transaction.atomic(using=db):
+                            cursor.execute(insert, [key, encoded, expires])
+                    except IntegrityError:
+                        return False
+                    return True
+                cursor.execute(f'UPDATE {table} SET {value_column} = %s, {expires_column} = %s '
+                               f'WHERE {key_column} = %s', [encoded, expires, key])
+                if cursor.rowcount == 0:
+                    cursor.execute(insert, [key, encoded, expires])
+        except DatabaseError:
+            # As in Django's: a concurrent write of the same key got there first.
+            return False
+        return True
+
+
+def get_many(keys):
+    local = caches['local']
+    found = local.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        fetched = caches['shared'].get_many(missing)
+        local.set_many(fetched)
+        found.update(fetched)
+    return found
+
+
+async def aget_many(keys):
+    local = caches['local']
+    found = local.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        fetched = await caches['shared'].aget_many(missing)
+        local.set_many(fetched)
+        found.update(fetched)
+    return found
+
+
+def get(key):
+    return get_many([key]).get(key)
+
+
+async def aget(key):
+    return (await aget_many([key])).get(key)
+
+
+def set_many(values, timeout):
+    caches['shared'].set_many(values, timeout)
+    caches['local'].set_many(values)
+
+
+def add(key, value, timeout):
+    """Store `value` unless `key` is already set; True when stored."""
+    added = caches['shared'].add(key, value, timeout)
+    if added:
+        caches['local'].set(key, value)
+    return added
+
+
+def delete(key):
+    caches['shared'].delete(key)
+    caches['local'].delete(key)
@@ -0,0 +1,33 @@
+"""
+SQLite engine for the `production` database profile (ENGINE 'backend.sqlite').
+
+It understands two OPTIONS of its own, kept away from sqlite3.connect():
+
+- `pragmas`: `{name: value}` applied to every new connection (journal mode,
+  synchronous, busy_timeout, mmap and cache size);
+- `transaction_mode`: 'IMMEDIATE' opens atomic() blocks with BEGIN IMMEDIATE.
+  A deferred transaction that reads before it writes cannot wait out another
+  writer (SQLite returns "database is locked" at once rather than deadlock),
+  so taking the write lock up front lets busy_timeout queue the writers.
+"""
+from django.db.backends.sqlite3 import base
+
+OWN_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in OWN_OPTIONS:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,92 @@
+"""
+Tests for the replica router and middleware: safe requests read from a
+replica unless the client has just written, and the pin that says so is
+seen by every process.
+"""
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from courses.models import Course
+from .replicas import ReplicaMiddleware, primary
+
+
+def read_alias(request):
+    """A view answering with the alias its reads would use."""
+    return HttpResponse(router.db_for_read(Course))
+
+
+async def aread_alias(request):
+    return read_alias(request)
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x', role='student')
+        cls.other = User.objects.create_user('other', password='x', role='student')
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.factory = RequestFactory()
+
+    def request(self, method='get', user=None, path='/api/courses/', **extra):
+        if user is not None:
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return getattr(self.factory, method)(path, **extra)
+
+    def alias(self, request, status=200):
+        def view(request):
+            response = read_alias(request)
+            response.status_code = status
+            return response
+        return ReplicaMiddleware(view)(request).content.decode()
+
+    async def aalias(self, request):
+        return (await ReplicaMiddleware(aread_alias)(request)).content.decode()
+
+    def test_safe_reads_go_to_a_replica_and_the_rest_to_default(self):
+        self.assertEqual(self.alias(self.request(user=self.student)), 'replica')
+        self.assertEqual(self.alias(self.request('post', user=self.student)), 'default')
+        self.assertEqual(self.alias(self.request(path='/api/courses/?since=1')), 'default')
+
+    def test_a_write_pins_the_writer_in_the_shared_cache(self):
+        self.alias(self.request('post', user=self.student))
+        self.assertEqual(caches['shared'].get(f'replicas:pinned:user:{self.student.pk}'), True)
+        self.assertEqual(self.alias(self.request(user=self.student)), 'default')
+        self.assertEqual(self.alias(self.request(user=self.other)), 'replica')
+
+    def test_a_session_is_pinned_too(self):
+        self.factory.cookies['sessionid'] = 'abc'
+        self.alias(self.request('post'))
+        self.assertEqual(self.alias(self.request()), 'default')
+        del self.factory.cookies['sessionid']
+        self.assertEqual(self.alias(self.request()), 'replica')
+
+    def test_a_failed_write_does_not_pin(self):
+        self.alias(self.request('post', user=self.student), status=400)
+        self.assertEqual(self.alias(self.request(user=self.student)), 'replica')
+
+    async def test_async_requests_are_routed_and_pinned_alike(self):
+        self.assertEqual(await self.aalias(self.request(user=self.student)), 'replica')
+        self.assertEqual(await self.aalias(self.request('post', user=self.student)), 'default')
+        self.assertEqual(await self.aalias(self.request(user=self.student)), 'default')
+
+    def test_primary_and_the_cache_table_read_from_default(self):
+        def view(request):
+            with primary():
+                inside = router.db_for_read(Course)
+            cache_alias = router.db_for_read(caches['shared'].cache_model_class)
+            return HttpResponse(f'{inside} {cache_alias} {router.db_for_read(Course)}')
+        response = ReplicaMiddleware(view)(self.request())
+        self.assertEqual(response.content.decode(), 'default default replica')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_middleware_is_skipped_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaMiddleware(read_alias)
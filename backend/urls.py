@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.views.generic import TemplateView
+from .perf import PerfStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,6 +12,7 @@ urlpatterns = [
     # API Routes
     path('api/accounts/', include('accounts.urls')),
     path('api/courses/', include('courses.urls')),
+    path('api/_perf/', PerfStatsView.as_view(), name='perf-stats'),
     # Frontend
     path('', TemplateView.as_view(template_name='index.html'), name='login'),
     path('courses/', TemplateView.as_view(template_name='courses.html'), name='courses'),
@@ -1,40 +1,173 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import Course, Lesson, Assignment, Submission
 
+# Filtered changelists count at most this many rows (see EstimatedCountPaginator).
+COUNT_LIMIT = 10000
 
-class LessonInline(admin.TabularInline):
-    model = Lesson
-    extra = 1
 
+def estimated_rows(queryset):
+    """The database's cheap estimate of the rows in `queryset`'s table, or None."""
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [table])
+        elif connection.vendor == 'sqlite':
+            # Read off the end of the table's B-tree; deleted rows make it an overestimate.
+            cursor.execute(f'SELECT MAX(rowid) FROM {table}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first analyzed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
 
-class AssignmentInline(admin.TabularInline):
-    model = Assignment
-    extra = 1
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that never runs COUNT(*) over a whole large table.
+    Unfiltered, the count is the database's estimate; filtered, at most
+    COUNT_LIMIT rows are counted, so page links stop there.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimated_rows(queryset)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    A list filter typed into a box, for relations with too many values to
+    list (the default filter renders every one). Subclasses set `title`,
+    `parameter_name` and the `lookup` the value is matched with.
+    """
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Non-empty, or the filter is not shown at all.
+        return [(None, '')]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.lookup: self.value().strip()})
+        except (ValueError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, changelist):
+        # Just "All"; the form resubmits the other filters (not the page) as
+        # hidden fields.
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR]),
+            'query_parts': [(key, value) for key, value in changelist.params.items()
+                            if key not in (self.parameter_name, PAGE_VAR)],
+        }
+
+
+class InstructorFilter(InputFilter):
+    title = 'instructor (username)'
+    parameter_name = 'instructor'
+    lookup = 'instructor__username'
+
+
+class CourseFilter(InputFilter):
+    title = 'course (title contains)'
+    parameter_name = 'course'
+    lookup = 'course__title__icontains'
+
+
+class SubmissionCourseFilter(CourseFilter):
+    lookup = 'assignment__course__title__icontains'
+
+
+def course_rows(course, model, count):
+    """
+    Links from a course's change page to its `model` rows, in place of an
+    inline: the changelist filtered to the course, and the add page.
+    """
+    opts = model._meta
+    changelist = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+    add = reverse(f'admin:{opts.app_label}_{opts.model_name}_add')
+    return format_html('<a href="{}?course__id__exact={}">{} {}</a> &middot; '
+                       '<a href="{}?course={}">Add</a>',
+                       changelist, course.pk, count, opts.verbose_name_plural, add, course.pk)
 
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'is_published', 'created_at']
-    list_filter = ['is_published', 'instructor']
+    list_filter = ['is_published', InstructorFilter]
+    list_select_related = ['instructor']
     search_fields = ['title', 'description']
-    inlines = [LessonInline, AssignmentInline]
-    filter_horizontal = ['students']
+    autocomplete_fields = ['instructor', 'students']
+    # Links rather than inlines, so the page does not grow with the course.
+    readonly_fields = ['lesson_links', 'assignment_links']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='lessons')
+    def lesson_links(self, course):
+        if course.pk is None:
+            return self.get_empty_value_display()
+        return course_rows(course, Lesson, course.lesson_count)
+
+    @admin.display(description='assignments')
+    def assignment_links(self, course):
+        if course.pk is None:
+            return self.get_empty_value_display()
+        return course_rows(course, Assignment, course.assignment_count)
 
 
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
     list_display = ['title', 'course', 'order', 'created_at']
-    list_filter = ['course']
+    list_filter = [CourseFilter]
+    list_select_related = ['course']
+    autocomplete_fields = ['course']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Assignment)
 class AssignmentAdmin(admin.ModelAdmin):
     list_display = ['title', 'course', 'due_date', 'max_score']
-    list_filter = ['course']
+    list_filter = [CourseFilter]
+    list_select_related = ['course']
+    search_fields = ['title', 'course__title']
+    autocomplete_fields = ['course']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # __str__ shows the course title, here and in autocomplete results.
+        return super().get_queryset(request).select_related('course')
 
 
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ['student', 'assignment', 'status', 'score', 'submitted_at']
-    list_filter = ['status', 'assignment__course']
+    list_filter = ['status', SubmissionCourseFilter]
+    list_select_related = ['student', 'assignment__course']
+    autocomplete_fields = ['assignment', 'student']
     readonly_fields = ['submitted_at', 'updated_at']
+    # Newest first off the primary key: `submitted_at` has no index of its
+    # own, so the model's ordering would sort the whole table per page.
+    ordering = ['-pk']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,192 @@
+"""
+Course analytics rollups.
+
+Dashboards read small summary tables instead of aggregating submissions per
+request:
+
+- CourseDailyStats: a course's enrolled-student count on each day it changed;
+- AssignmentDailyStats: submissions (and late ones) per assignment per day;
+- AssignmentStats: per-assignment totals, score histogram and the summed
+  time from due date to submission.
+
+`refresh()` brings them up to date incrementally from a watermark. Any
+submission or assignment changed since then (by `updated_at`) marks its
+assignment dirty, and every dirty assignment's rollups are recomputed with
+grouped aggregates over its own submissions. Processing a row twice is
+harmless, so each run re-covers the end of the previous one for writes that
+committed late. Deleting a course or assignment cascades to its rollups.
+
+The enrollment table has no timestamps, so enrollment history starts at the
+first refresh: each run records today's `Course.student_count` for courses
+whose counters moved (which bumps `Course.updated_at`).
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .gradebook import HISTOGRAM_BUCKETS, bucket_counts, score_bucket
+from .models import (
+    Assignment, AssignmentDailyStats, AssignmentStats, Course, CourseDailyStats, Submission,
+    Watermark,
+)
+
+WATERMARK = 'analytics'
+# Re-cover the end of the previous run, for transactions still open then.
+OVERLAP = timedelta(minutes=5)
+
+# 'missing' placeholders (process_deadlines) are counted, never submitted.
+COUNTED = ~Q(status='missing')
+LATE = COUNTED & Q(submitted_at__gt=F('assignment__due_date'))
+DELAY = ExpressionWrapper(F('submitted_at') - F('assignment__due_date'),
+                          output_field=DurationField())
+
+
+def last_refresh():
+    return Watermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+
+
+def dirty_assignments(since):
+    """Ids of assignments whose rollups may be out of date (all when `since` is None)."""
+    assignments = Assignment.objects.order_by('pk')
+    if since is not None:
+        changed = Submission.objects.filter(updated_at__gte=since).values('assignment_id')
+        assignments = assignments.filter(Q(updated_at__gte=since) | Q(pk__in=changed))
+    return assignments.values_list('pk', flat=True)
+
+
+def refresh_assignments(ids):
+    """Recompute the AssignmentStats and AssignmentDailyStats of assignments `ids`."""
+    course_of = dict(Assignment.objects.filter(pk__in=ids).values_list('pk', 'course_id'))
+    submissions = Submission.objects.filter(assignment_id__in=course_of).order_by()
+    totals = {
+        row['assignment_id']: row for row in
+        submissions.annotate(bucket=score_bucket()).values('assignment_id').annotate(
+            submitted=Count('id', filter=COUNTED),
+            graded=Count('id', filter=Q(status='graded')),
+            late=Count('id', filter=LATE),
+            missing=Count('id', filter=Q(status='missing')),
+            score_total=Sum('score'),
+            delay_total=Sum(DELAY, filter=COUNTED),
+            **bucket_counts(),
+        )
+    }
+    daily = (submissions.filter(COUNTED)
+             .values('assignment_id', date=TruncDate('submitted_at'))
+             .annotate(submitted=Count('id'), late=Count('id', filter=LATE)))
+
+    stats = []
+    for assignment_id, course_id in course_of.items():
+        row = totals.get(assignment_id, {})
+        stats.append(AssignmentStats(
+            assignment_id=assignment_id, course_id=course_id,
+            submitted=row.get('submitted', 0), graded=row.get('graded', 0),
+            late=row.get('late', 0), missing=row.get('missing', 0),
+            score_total=row.get('score_total') or 0,
+            histogram=[row.get(f'bucket_{i}', 0) for i in range(HISTOGRAM_BUCKETS)],
+            delay_total=row.get('delay_total') or timedelta(0),
+        ))
+    days = [AssignmentDailyStats(course_id=course_of[row['assignment_id']], **row)
+            for row in daily]
+    with transaction.atomic():
+        AssignmentStats.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['assignment'],
+            update_fields=['submitted', 'graded', 'late', 'missing', 'score_total',
+                           'histogram', 'delay_total', 'refreshed_at'])
+        AssignmentDailyStats.objects.filter(assignment_id__in=course_of).delete()
+        AssignmentDailyStats.objects.bulk_create(days, batch_size=500)
+
+
+def record_enrollment(since, today):
+    """Record today's student count of courses changed since `since`; returns how many."""
+    courses = Course.objects.all()
+    if since is not None:
+        courses = courses.filter(updated_at__gte=since)
+    rows = [CourseDailyStats(course_id=pk, date=today, student_count=n)
+            for pk, n in courses.values_list('pk', 'student_count')]
+    CourseDailyStats.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, unique_fields=['course', 'date'],
+        update_fields=['student_count'])
+    return len(rows)
+
+
+def refresh(full=False, batch_size=500):
+    """
+    Bring the rollups up to date (all of them with `full`); returns the
+    number of assignments and courses refreshed.
+    """
+    started = timezone.now()
+    mark = None if full else last_refresh()
+    since = mark - OVERLAP if mark is not None else None
+
+    # Ids read up front: the batches below must not re-run the dirty query.
+    ids = iter(list(dirty_assignments(since)))
+    assignments = 0
+    while chunk := list(islice(ids, batch_size)):
+        refresh_assignments(chunk)
+        assignments += len(chunk)
+    courses = record_enrollment(since, timezone.localdate(started))
+
+    Watermark.objects.update_or_create(name=WATERMARK, defaults={'value': started})
+    return assignments, courses
+
+
+# ── Reading ──────────────────────────────────────────────────────────────────
+
+def hours(delta):
+    return round(delta.total_seconds() / 3600, 2)
+
+
+def course_analytics(course, since_date=None):
+    """
+    The dashboard payload for `course`, read from the rollups only. Daily
+    series start at `since_date` when given.
+    """
+    def dated(queryset):
+        return queryset.filter(date__gte=since_date) if since_date else queryset
+
+    enrollment = dated(CourseDailyStats.objects.filter(course=course)).order_by('date')
+    per_day = (dated(AssignmentDailyStats.objects.filter(course=course))
+               .values('date').annotate(submitted=Sum('submitted'), late=Sum('late'))
+               .order_by('date'))
+    stats = (AssignmentStats.objects.filter(course=course).select_related('assignment')
+             .order_by('assignment__due_date', 'assignment_id'))
+
+    assignments = []
+    distribution = [0] * HISTOGRAM_BUCKETS
+    submitted = 0
+    delay = timedelta(0)
+    for row in stats:
+        scored = sum(row.histogram)
+        distribution = [a + b for a, b in zip(distribution, row.histogram)]
+        submitted += row.submitted
+        delay += row.delay_total
+        assignments.append({
+            'id': row.assignment_id,
+            'title': row.assignment.title,
+            'due_date': row.assignment.due_date,
+            'max_score': row.assignment.max_score,
+            'submitted': row.submitted,
+            'graded': row.graded,
+            'late': row.late,
+            'missing': row.missing,
+            'mean': round(row.score_total / scored, 2) if scored else None,
+            'histogram': row.histogram,
+            'average_hours_after_due': hours(row.delay_total / row.submitted)
+                                       if row.submitted else None,
+        })
+
+    return {
+        'course': {'id': course.id, 'title': course.title,
+                   'student_count': course.student_count},
+        'refreshed_at': last_refresh(),
+        'enrollment': [{'date': row.date, 'student_count': row.student_count}
+                       for row in enrollment],
+        'submissions_per_day': list(per_day),
+        'grade_distribution': distribution,
+        'average_hours_after_due': hours(delay / submitted) if submitted else None,
+        'assignments': assignments,
+    }
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class CoursesConfig(AppConfig):
+    name = 'courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_index
+
+        # The FTS5 table has no model, so create it alongside the migrations.
+        post_migrate.connect(lambda **kwargs: ensure_index(), sender=self, weak=False)
@@ -0,0 +1,305 @@
+"""
+Content-addressed body store for lesson and submission text.
+
+A `BodyTextField` keeps short text inline, as a plain TextField would. With
+BODY_STORE_MIN_LENGTH set, text that long or longer is zlib-compressed into
+the `Body` table under its SHA-256 and the row keeps only a PREVIEW_LENGTH
+prefix inline, next to a foreign key to the body. Identical text (a
+resubmission, a pasted template) is stored once. List queries then read
+short rows, and `excerpt` still comes straight from the inline column.
+
+`instance.content` is always the full text: the body is loaded on first
+access, or for a page of rows at once by `prefetch()` (the serializers'
+BodyField does this). Assigning text, or passing it to `QuerySet.update()`
+on a StoredBodyQuerySet, stores it afresh. Bodies are immutable;
+`manage.py move_bodies` moves existing rows in or out of the store and
+prunes bodies nothing refers to any more.
+"""
+import hashlib
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+PREVIEW_LENGTH = 200    # covers serializers.EXCERPT_LENGTH
+
+
+def min_length():
+    """Shortest text moved to the store, or None when the store is off."""
+    return getattr(settings, 'BODY_STORE_MIN_LENGTH', None)
+
+
+def digest_of(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def pack(text):
+    from .models import Body
+
+    data = text.encode()
+    return Body(digest=hashlib.sha256(data).hexdigest(), data=zlib.compress(data),
+                length=len(text))
+
+
+def unpack(data):
+    return zlib.decompress(data).decode()
+
+
+def put_many(texts):
+    """Store `texts`, skipping those already present; returns their digests."""
+    from .models import Body
+
+    rows = {row.digest: row for row in map(pack, texts)}
+    Body.objects.bulk_create(rows.values(), ignore_conflicts=True)
+    return [digest_of(text) for text in texts]
+
+
+def get_many(digests):
+    """`{digest: text}` for `digests`, in one query."""
+    from .models import Body
+
+    return {digest: unpack(data) for digest, data in
+            Body.objects.filter(pk__in=set(digests)).values_list('digest', 'data')}
+
+
+async def aget_many(digests):
+    from .models import Body
+
+    return {digest: unpack(data) async for digest, data in
+            Body.objects.filter(pk__in=set(digests)).values_list('digest', 'data')}
+
+
+def split(text):
+    """(inline value, body digest or None) for storing `text`."""
+    limit = min_length()
+    if limit is None or len(text) < limit:
+        return text, None
+    return text[:PREVIEW_LENGTH], put_many([text])[0]
+
+
+class BodyDescriptor(DeferredAttribute):
+    """
+    `instance.<name>` is always the full text, loaded from the store on first
+    access; assigning to it always means new text, split again on save. The
+    inline column value stays in `instance.__dict__` as for any field.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        if self.field.attname not in instance.__dict__:
+            load_deferred(instance, self.field)
+        return text(instance, self.field.name)
+
+    def __set__(self, instance, value):
+        loaded = instance.__dict__
+        loaded[self.field.attname] = value
+        loaded[self.field.assigned_key] = True
+        loaded.pop(self.field.text_key, None)
+
+
+class BodyTextField(models.TextField):
+    """
+    A TextField whose long values live in the body store. The model declares
+    the matching `<name>_body` foreign key to Body, mixes in StoredBodyMixin
+    (whose `save()` fills it in) and uses a StoredBodyQuerySet manager.
+    """
+    descriptor_class = BodyDescriptor
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        self.body_name = f'{name}_body'
+        self.body_attname = f'{name}_body_id'
+        self.assigned_key = f'_assigned_{name}'
+        self.text_key = f'_text_{name}'
+
+    def pre_save(self, model_instance, add):
+        # The column value, never the full text the descriptor returns.
+        loaded = model_instance.__dict__
+        if self.attname not in loaded:
+            getattr(model_instance, self.attname)
+        if self.assigned_key in loaded:
+            # Saved without going through StoredBodyMixin.save().
+            store([model_instance])
+        return loaded[self.attname]
+
+
+@lru_cache(maxsize=None)
+def body_fields(model):
+    return tuple(field for field in model._meta.concrete_fields
+                 if isinstance(field, BodyTextField))
+
+
+def load_deferred(instance, field):
+    """Read `field`'s deferred column, its digest and the body behind it in one query."""
+    inline, digest, data = (
+        type(instance)._base_manager.db_manager(hints={'instance': instance})
+        .filter(pk=instance.pk)
+        .values_list(field.attname, field.body_attname, f'{field.body_name}__data')
+        .get())
+    loaded = instance.__dict__
+    loaded[field.attname] = inline
+    loaded[field.body_attname] = digest
+    loaded.pop(field.assigned_key, None)
+    loaded.pop(field.text_key, None)
+    if data is not None:
+        loaded[field.text_key] = unpack(data)
+
+
+def store(instances, names=None):
+    """
+    Split the text newly assigned to `instances` (only for the fields `names`,
+    when given) before they are saved: text long enough goes to the store,
+    all of it in one query, and the row keeps a preview and its digest.
+    """
+    limit = min_length()
+    texts = []
+    for instance in instances:
+        loaded = instance.__dict__
+        for field in body_fields(type(instance)):
+            if field.assigned_key not in loaded or (
+                    names is not None and not {field.name, field.attname} & names):
+                continue
+            del loaded[field.assigned_key]
+            value = loaded[field.attname]
+            digest = None
+            if limit is not None and isinstance(value, str) and len(value) >= limit:
+                digest = digest_of(value)
+                texts.append(value)
+                loaded[field.attname] = value[:PREVIEW_LENGTH]
+                loaded[field.text_key] = value
+            setattr(instance, field.body_attname, digest)
+    if texts:
+        put_many(texts)
+
+
+class StoredBodyMixin:
+    """
+    Tells the inline values read from the database from newly assigned text,
+    and splits the latter when the instance is saved.
+    """
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for field in body_fields(type(self)):
+                if field.assigned_key in self.__dict__ and {field.name, field.attname} & update_fields:
+                    update_fields.add(field.body_name)
+        store([self], update_fields)
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    save.alters_data = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        remember(instance)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        remember(self, fields)
+
+
+def remember(instance, names=None):
+    loaded = instance.__dict__
+    for field in body_fields(type(instance)):
+        if names is not None and field.name not in names and field.attname not in names:
+            continue
+        if field.attname not in loaded:
+            continue
+        loaded.pop(field.assigned_key, None)
+        loaded.pop(field.text_key, None)
+        value = loaded[field.attname]
+        if loaded.get(field.body_attname) is not None and len(value) > PREVIEW_LENGTH:
+            # refresh_from_db() copies the full text over; keep it, and the
+            # preview that is in the column.
+            loaded[field.text_key] = value
+            loaded[field.attname] = value[:PREVIEW_LENGTH]
+
+
+class StoredBodyQuerySet(models.QuerySet):
+    """
+    `bulk_create()` and `update()` store text given for a BodyTextField the
+    way `save()` would. An expression's result is kept inline, unless the
+    `<name>_body` column is updated alongside it.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        store(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    bulk_create.alters_data = True
+
+    def update(self, **kwargs):
+        for field in body_fields(self.model):
+            if field.name in kwargs and not {field.body_name, field.body_attname} & kwargs.keys():
+                value = kwargs[field.name]
+                kwargs[field.name], kwargs[field.body_attname] = (
+                    split(value) if isinstance(value, str) else (value, None))
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+
+def pending(instance, field):
+    """
+    The body digest whose text `instance` still has to load for `field`, or
+    None. A body joined in with select_related('<name>_body') is used as is.
+    """
+    loaded = instance.__dict__
+    if (field.attname not in loaded or field.text_key in loaded
+            or field.assigned_key in loaded):
+        return None
+    digest = getattr(instance, field.body_attname)
+    relation = instance._meta.get_field(field.body_name)
+    if digest is not None and relation.is_cached(instance):
+        loaded[field.text_key] = unpack(relation.get_cached_value(instance).data)
+        return None
+    return digest
+
+
+def text(instance, name='content'):
+    """The full text of `instance`'s BodyTextField `name`, loading its body if needed."""
+    field = instance._meta.get_field(name)
+    loaded = instance.__dict__
+    if field.attname not in loaded:
+        # Deferred; the descriptor reads the column first.
+        return getattr(instance, field.attname)
+    digest = pending(instance, field)
+    if digest is not None:
+        loaded[field.text_key] = get_many([digest])[digest]
+    return loaded.get(field.text_key, loaded[field.attname])
+
+
+def wanted(instances, names):
+    fields = [field for field in body_fields(type(instances[0])) if field.name in names]
+    needed = [(instance, field, pending(instance, field))
+              for instance in instances for field in fields]
+    return [entry for entry in needed if entry[2] is not None]
+
+
+def fill(needed, texts):
+    for instance, field, digest in needed:
+        instance.__dict__[field.text_key] = texts[digest]
+
+
+def prefetch(instances, names=('content',)):
+    """Load the bodies of `instances` for the fields `names` in one query."""
+    instances = list(instances)
+    needed = wanted(instances, names) if instances else []
+    if needed:
+        fill(needed, get_many(digest for _, _, digest in needed))
+    return instances
+
+
+async def aprefetch(instances, names=('content',)):
+    """`prefetch()` for async views."""
+    instances = list(instances)
+    needed = wanted(instances, names) if instances else []
+    if needed:
+        fill(needed, await aget_many(digest for _, _, digest in needed))
+    return instances
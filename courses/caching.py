@@ -0,0 +1,214 @@
+"""
+Versioned response cache and conditional GET for the catalog reads.
+
+Every payload the cached views return depends on a few version stamps kept
+in the `shared` cache, which every server process reads: the catalog as a
+whole, each course (its detail page) and each course's lesson list. A
+stamp is the time of the last write that changed that data, so it doubles
+as `Last-Modified`. Writes replace the stamps after commit (see
+courses/signals.py and the enroll/roster views), and entries cached under
+the old stamps are simply never read again; the `responses` cache evicts
+them by size. Stamps are read through each process's short-lived copy
+(backend/shared_cache.py), so other processes may serve the old data for
+a few seconds after a write.
+
+Responses are shared between users. Per-user fields (`is_enrolled`) are
+blanked before caching and filled back in from the user's enrolled course
+ids, which are cached under a per-user stamp of their own. The ETag covers
+both, so a repeat request that has not changed costs no queries at all.
+Payloads and enrolled ids are keyed by the stamps, so the caches holding
+them can stay local to each process.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from backend import shared_cache
+from backend.replicas import primary
+
+CATALOG = 'courses:v:catalog'
+ENROLLED_TIMEOUT = 300
+
+
+def course_key(course_id):
+    return f'courses:v:course:{course_id}'
+
+
+def lessons_key(course_id):
+    return f'courses:v:lessons:{course_id}'
+
+
+def enrollments_key(user_id):
+    return f'courses:v:enrollments:{user_id}'
+
+
+def versions(keys):
+    """Current stamps for `keys`, starting any that are missing (or evicted) at now."""
+    found = shared_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            if shared_cache.add(key, now, None):
+                found[key] = now
+        # Started by another request in the meantime; or, unstored, a miss.
+        found.update(shared_cache.get_many([key for key in missing if key not in found]))
+        found = {key: found.get(key, now) for key in keys}
+    return [found[key] for key in keys]
+
+
+def bump(keys):
+    # After commit, so a concurrent miss cannot cache pre-write data under
+    # the new stamp.
+    def apply():
+        now = time.time_ns()
+        shared_cache.set_many({key: now for key in keys}, None)
+    transaction.on_commit(apply)
+
+
+def touch_courses(course_ids, catalog=True, lessons=False):
+    keys = [course_key(pk) for pk in course_ids]
+    if lessons:
+        keys += [lessons_key(pk) for pk in course_ids]
+    if catalog:
+        keys.append(CATALOG)
+    if keys:
+        bump(keys)
+
+
+def touch_enrollments(user_ids):
+    if user_ids:
+        bump([enrollments_key(pk) for pk in user_ids])
+
+
+def enrolled_course_ids(user, stamp):
+    key = f'courses:enrolled:{user.pk}:{stamp}'
+    ids = cache.get(key)
+    if ids is None:
+        with primary():
+            ids = frozenset(enrollment_query(user))
+        cache.set(key, ids, ENROLLED_TIMEOUT)
+    return ids
+
+
+async def aenrolled_course_ids(user, stamp):
+    """`enrolled_course_ids()` for async views."""
+    key = f'courses:enrolled:{user.pk}:{stamp}'
+    ids = cache.get(key)
+    if ids is None:
+        with primary():
+            ids = frozenset([pk async for pk in enrollment_query(user)])
+        cache.set(key, ids, ENROLLED_TIMEOUT)
+    return ids
+
+
+def enrollment_query(user):
+    from .models import Course
+
+    return Course.students.through.objects.filter(user_id=user.pk).values_list('course_id', flat=True)
+
+
+class CachedRead:
+    """
+    One GET through the cache, in steps: the validators (and a 304 when they
+    match), then the payload from the `responses` cache or, when
+    `needs_payload`, from the view via `store()`, then `finish()`. The async
+    read views (courses/async_views.py) fetch the payload their own way.
+    """
+
+    def __init__(self, view, request):
+        self.view = view
+        keys = view.version_keys()
+        if view.personal_enrollment:
+            keys.append(enrollments_key(request.user.pk))
+        self.stamps = versions(keys)
+        shared = self.stamps[:-1] if view.personal_enrollment else self.stamps
+        fmt = request.accepted_renderer.format
+        self.etag = '"%s"' % hashlib.md5(f'{fmt}:{self.stamps}'.encode()).hexdigest()
+        self.last_modified = max(self.stamps) // 10**9
+
+        self.response = get_conditional_response(request, etag=self.etag,
+                                                 last_modified=self.last_modified)
+        self.key = 'courses:response:' + hashlib.md5(
+            f'{shared}:{request.build_absolute_uri()}'.encode()).hexdigest()
+        self.data = caches['responses'].get(self.key) if self.response is None else None
+        self.hit = self.data is not None
+
+    @property
+    def needs_payload(self):
+        return self.response is None and self.data is None
+
+    @property
+    def needs_enrollment(self):
+        """Whether `finish()` wants the user's enrolled course ids (from `enrollment_stamp`)."""
+        return self.response is None and self.view.personal_enrollment
+
+    @property
+    def enrollment_stamp(self):
+        return self.stamps[-1]
+
+    def store(self, data):
+        self.data = self.view.blank(data)
+        caches['responses'].set(self.key, self.data)
+
+    def finish(self, enrolled=None):
+        response = self.response
+        if response is None:
+            data = self.data
+            if enrolled is not None:
+                data = self.view.personalize(data, enrolled)
+            response = Response(data)
+            response['X-Cache'] = 'HIT' if self.hit else 'MISS'
+
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+class CachedReadMixin:
+    """
+    GET through the `responses` cache, with ETag/Last-Modified validation.
+
+    Subclasses list the version keys their payload depends on in
+    `version_keys()`. Set `personal_enrollment` when the payload carries
+    `is_enrolled` (top level, or per item of a paginated `results`).
+    """
+    personal_enrollment = False
+
+    def version_keys(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        read = CachedRead(self, request)
+        if read.needs_payload:
+            # From the primary: a lagging replica would cache stale data
+            # under the stamp of the write it has not seen yet.
+            with primary():
+                response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            read.store(response.data)
+        enrolled = None
+        if read.needs_enrollment:
+            enrolled = enrolled_course_ids(request.user, read.enrollment_stamp)
+        return read.finish(enrolled)
+
+    def blank(self, data):
+        if 'results' in data:
+            return {**data, 'results': [self.blank(item) for item in data['results']]}
+        return {**data, 'is_enrolled': False} if 'is_enrolled' in data else dict(data)
+
+    def personalize(self, data, enrolled):
+        if 'results' in data:
+            return {**data, 'results': [self.personalize(item, enrolled)
+                                        for item in data['results']]}
+        if 'is_enrolled' not in data:
+            return data
+        return {**data, 'is_enrolled': data['id'] in enrolled}
@@ -0,0 +1,82 @@
+"""
+Deadline processing: mark submissions made after the due date 'late' and
+give every enrolled student who submitted nothing a 'missing' placeholder.
+
+Work is done one due-date window at a time, each in its own transaction, so
+a run touches a bounded slice of the submissions table however large it
+gets. Within a window both steps are set-based: one UPDATE marks the late
+submissions, and one query finds every missing (assignment, student) pair,
+inserted `batch_size` per statement. Both are idempotent (the UPDATE only
+matches 'submitted' rows, placeholders are inserted with ignore_conflicts),
+so overlapping windows and repeated runs are safe.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import Assignment, Course, Submission
+
+
+def late_submissions(assignment_ids):
+    return Submission.objects.filter(
+        assignment_id__in=assignment_ids, status='submitted',
+        submitted_at__gt=F('assignment__due_date'),
+    )
+
+
+def missing_placeholders(assignment_ids):
+    """
+    (assignment_id, student_id) of every enrolled student with no submission
+    to one of `assignment_ids`, in a single query for them all.
+    """
+    submitted = Submission.objects.filter(assignment_id=OuterRef('assignment_id'),
+                                          student_id=OuterRef('user_id'))
+    return (Course.students.through.objects
+            .filter(course__assignments__in=assignment_ids)
+            .annotate(assignment_id=F('course__assignments'))
+            .filter(~Exists(submitted))
+            .order_by().values_list('assignment_id', 'user_id'))
+
+
+def process_window(start, end, batch_size=1000, dry_run=False):
+    """Process assignments due in [start, end); returns (late, missing) counts."""
+    assignment_ids = list(Assignment.objects.filter(due_date__gte=start, due_date__lt=end)
+                          .order_by().values_list('id', flat=True))
+    if not assignment_ids:
+        return 0, 0
+    with transaction.atomic():
+        late = late_submissions(assignment_ids)
+        late = late.count() if dry_run else late.update(status='late', updated_at=timezone.now())
+        missing = missing_placeholders(assignment_ids)
+        if dry_run:
+            return late, missing.count()
+        # Ids only, read up front: the inserts below change what the query
+        # matches, so it must not be consumed while they run.
+        pairs = iter(list(missing))
+        missing = 0
+        while chunk := list(islice(pairs, batch_size)):
+            missing += len(chunk)
+            # A student submitting right now wins; their row is kept.
+            Submission.objects.bulk_create(
+                [Submission(assignment_id=assignment_id, student_id=student_id,
+                            content='', status='missing') for assignment_id, student_id in chunk],
+                ignore_conflicts=True,
+            )
+    return late, missing
+
+
+def process_deadlines(since, until=None, window=timedelta(days=1), **kwargs):
+    """Process every assignment due in [since, until), window by window."""
+    until = until or timezone.now()
+    late = missing = 0
+    start = since
+    while start < until:
+        end = min(start + window, until)
+        window_late, window_missing = process_window(start, end, **kwargs)
+        late += window_late
+        missing += window_missing
+        start = end
+    return late, missing
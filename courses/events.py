@@ -0,0 +1,123 @@
+"""
+Server-sent events: per-user fan-out of grading, assignment and enrollment
+changes, streamed at `/api/courses/events/`.
+
+Views call `publish()`; the event goes out after the surrounding
+transaction commits. Delivery goes through the broker named by the
+EVENTS_BROKER setting. The default InProcessBroker reaches subscribers in
+the same process only, so deployments with several worker processes need a
+broker backed by something shared (Redis pub/sub, Postgres LISTEN/NOTIFY)
+that implements the same two methods:
+
+- `publish(user_ids, event_type, data)`, callable from any thread;
+- `subscribe(user_id, last_event_id=None)`, called on the event loop,
+  returning a subscription with `backlog`, `async get(timeout)` and
+  `close()`.
+
+Each subscriber costs one asyncio.Queue, so a single ASGI worker can hold
+thousands of idle streams.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    def __init__(self, broker, user_id, loop, backlog, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = loop
+        self.backlog = backlog
+        self.queue = asyncio.Queue(maxsize)
+
+    def push(self, event):
+        """Hand `event` to the subscriber's loop; safe from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is gone; the stream was torn down without close().
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            # A stalled client loses its oldest events, not the newest.
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fan-out within this process. The last `history` events per user are kept
+    so a client reconnecting with Last-Event-ID misses nothing in between.
+    """
+
+    def __init__(self, history=50, queue_size=100):
+        # Re-entrant: a dead subscription unsubscribes itself during publish().
+        self.lock = threading.RLock()
+        self.subscribers = defaultdict(set)
+        self.history = defaultdict(lambda: deque(maxlen=history))
+        self.queue_size = queue_size
+        self.last_id = 0
+
+    def next_id(self):
+        # Time-based, so ids stay increasing across restarts.
+        self.last_id = max(self.last_id + 1, time.time_ns() // 1000)
+        return self.last_id
+
+    def publish(self, user_ids, event_type, data):
+        with self.lock:
+            for user_id in user_ids:
+                event = {'id': self.next_id(), 'type': event_type, 'data': data}
+                self.history[user_id].append(event)
+                for subscription in list(self.subscribers.get(user_id, ())):
+                    subscription.push(event)
+
+    def subscribe(self, user_id, last_event_id=None):
+        with self.lock:
+            backlog = []
+            if last_event_id is not None:
+                backlog = [e for e in self.history.get(user_id, ()) if e['id'] > last_event_id]
+            subscription = Subscription(self, user_id, asyncio.get_running_loop(),
+                                        backlog, self.queue_size)
+            self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    path = getattr(settings, 'EVENTS_BROKER', 'courses.events.InProcessBroker')
+    return import_string(path)()
+
+
+def publish(user_ids, event_type, data):
+    """Send `event_type` to `user_ids` once the current transaction commits."""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: get_broker().publish(user_ids, event_type, data))
+
+
+def format_event(event):
+    return (f"id: {event['id']}\nevent: {event['type']}\n"
+            f"data: {json.dumps(event['data'], cls=DjangoJSONEncoder)}\n\n")
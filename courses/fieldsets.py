@@ -0,0 +1,74 @@
+"""
+Sparse fieldsets for GET responses.
+
+`?fields=title,due_date` keeps only the named fields and `?omit=description`
+drops them; `id` is always kept. The selection applies to the top-level
+serializer of the response, and the view defers every TextField column the
+selected fields do not read, so unrequested bodies never leave SQLite.
+
+Serializers can also declare, in their Meta:
+
+- `list_omit`: fields left out of list responses unless `?fields=` names them.
+- `list_only`: fields that only exist in list responses.
+- `annotations`: queryset expressions backing such fields, added only when
+  the field is selected.
+"""
+from django.db import models
+from rest_framework import serializers
+
+
+def split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsSerializerMixin:
+    @classmethod
+    def select(cls, names, params, listing):
+        meta = cls.Meta
+        if not listing:
+            names = [name for name in names if name not in getattr(meta, 'list_only', ())]
+        requested = split(params.get('fields'))
+        if requested:
+            names = [name for name in names if name in requested or name == 'id']
+        elif listing:
+            names = [name for name in names if name not in getattr(meta, 'list_omit', ())]
+        omit = split(params.get('omit')) - {'id'}
+        return [name for name in names if name not in omit]
+
+    @classmethod
+    def sparse_queryset(cls, queryset, params, listing):
+        selected = cls.select(cls.Meta.fields, params, listing)
+        declared = cls._declared_fields
+        # A declared field may read a differently named column (`source`).
+        used = {(getattr(declared.get(name), 'source', None) or name).split('.')[0]
+                for name in selected}
+        unused = [field.name for field in cls.Meta.model._meta.concrete_fields
+                  if isinstance(field, models.TextField) and field.name not in used]
+        if unused:
+            queryset = queryset.defer(*unused)
+        annotations = {name: expression
+                       for name, expression in getattr(cls.Meta, 'annotations', {}).items()
+                       if name in selected}
+        return queryset.annotate(**annotations) if annotations else queryset
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        listing = isinstance(self.parent, serializers.ListSerializer)
+        top_level = (self.parent.parent if listing else self.parent) is None
+        if request is not None and request.method == 'GET' and top_level:
+            keep = self.select(list(fields), request.query_params, listing)
+        else:
+            # Writes and nested use take the full field set.
+            keep = self.select(list(fields), {}, listing=False)
+        return {name: fields[name] for name in keep}
+
+
+class SparseFieldsViewMixin:
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if self.request.method != 'GET' or not hasattr(serializer_class, 'sparse_queryset'):
+            return queryset
+        listing = (self.lookup_url_kwarg or self.lookup_field) not in self.kwargs
+        return serializer_class.sparse_queryset(queryset, self.request.query_params, listing)
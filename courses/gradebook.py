@@ -0,0 +1,126 @@
+"""
+Gradebook queries for a single course.
+
+All statistics are grouped aggregates evaluated by the database; Python only
+reshapes the (small) per-assignment result rows into JSON.
+"""
+from collections import defaultdict
+
+from django.db.models import Avg, Count, F, IntegerField, Max, Q
+from django.db.models.functions import Least
+
+from .models import Assignment, Submission
+
+HISTOGRAM_BUCKETS = 10
+
+
+def course_submissions(course):
+    """
+    Submissions to `course` from students currently enrolled in it, without
+    the 'missing' placeholders process_deadlines adds.
+    """
+    return Submission.objects.filter(
+        assignment__course=course, student__enrolled_courses=course
+    ).exclude(status='missing').order_by()
+
+
+def median_of(counts):
+    """Median of a sorted `[(value, frequency), ...]` distribution."""
+    total = sum(n for _, n in counts)
+    lower, upper = (total - 1) // 2, total // 2
+    seen = 0
+    low = None
+    for value, n in counts:
+        if low is None and seen + n > lower:
+            low = value
+        if seen + n > upper:
+            return (low + value) / 2
+        seen += n
+    return None
+
+
+def score_bucket():
+    """
+    Histogram bucket of a submission's score: score * BUCKETS / max_score,
+    with the top score folded into the last bucket. NULL for ungraded rows
+    (and max_score = 0).
+    """
+    return Least(
+        F('score') * HISTOGRAM_BUCKETS / F('assignment__max_score'),
+        HISTOGRAM_BUCKETS - 1,
+        output_field=IntegerField(),
+    )
+
+
+def bucket_counts():
+    """`bucket_<i>` Count aggregates over a queryset annotated with `bucket`."""
+    return {f'bucket_{i}': Count('id', filter=Q(bucket=i)) for i in range(HISTOGRAM_BUCKETS)}
+
+
+def assignment_stats(course):
+    """Per-assignment submission rate, mean, median, max and score histogram."""
+    assignments = list(
+        Assignment.objects.filter(course=course)
+        .values('id', 'title', 'due_date', 'max_score')
+    )
+    submissions = course_submissions(course)
+    totals = {
+        row['assignment_id']: row for row in
+        submissions.annotate(bucket=score_bucket()).values('assignment_id').annotate(
+            submitted=Count('id'),
+            graded=Count('id', filter=Q(status='graded')),
+            mean=Avg('score'),
+            max=Max('score'),
+            **bucket_counts(),
+        )
+    }
+
+    # Median: scores are small bounded integers, so the per-assignment score
+    # frequency table has at most max_score + 1 rows; walk it to the middle.
+    frequencies = defaultdict(list)
+    for assignment_id, score, n in (
+        submissions.filter(score__isnull=False)
+        .values('assignment_id', 'score').annotate(n=Count('id'))
+        .order_by('assignment_id', 'score')
+        .values_list('assignment_id', 'score', 'n')
+    ):
+        frequencies[assignment_id].append((score, n))
+    medians = {assignment_id: median_of(counts) for assignment_id, counts in frequencies.items()}
+
+    enrolled = course.student_count
+    for assignment in assignments:
+        total = totals.get(assignment['id'], {})
+        submitted = total.get('submitted', 0)
+        assignment.update({
+            'submitted': submitted,
+            'graded': total.get('graded', 0),
+            'submission_rate': round(submitted / enrolled, 4) if enrolled else 0.0,
+            'mean': round(total['mean'], 2) if total.get('mean') is not None else None,
+            'median': medians.get(assignment['id']),
+            'max': total.get('max'),
+            'histogram': [total.get(f'bucket_{i}', 0) for i in range(HISTOGRAM_BUCKETS)],
+        })
+    return assignments
+
+
+def grade_rows(course, students, assignment_ids):
+    """
+    One row per student with a cell per assignment, in `assignment_ids` order.
+
+    `students` is a page of `{'id', 'username'}` dicts; cells are
+    `{'score', 'status'}` or None when nothing was submitted.
+    """
+    column = {assignment_id: i for i, assignment_id in enumerate(assignment_ids)}
+    rows = {
+        student['id']: {'student': student['id'], 'username': student['username'],
+                        'grades': [None] * len(assignment_ids)}
+        for student in students
+    }
+    cells = (
+        Submission.objects.filter(assignment__course=course, student_id__in=list(rows))
+        .order_by()
+        .values_list('student_id', 'assignment_id', 'score', 'status')
+    )
+    for student_id, assignment_id, score, status in cells:
+        rows[student_id]['grades'][column[assignment_id]] = {'score': score, 'status': status}
+    return [rows[student['id']] for student in students]
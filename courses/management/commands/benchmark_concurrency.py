@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.serializers import TokenObtainPairSerializer
+from .benchmark_endpoints import Command as EndpointBenchmark, percentile
+
+# The routes courses/async_views.py serves.
+READ_ROUTES = {
+    'course-list', 'course-detail', 'my-courses', 'lesson-list', 'lesson-detail',
+    'assignment-list', 'my-assignments', 'assignment-detail',
+    'submission-list', 'submission-detail',
+}
+
+# mode -> (handler, ASYNC_READ_VIEWS)
+MODES = {
+    'wsgi': ('wsgi', False),        # DRF views on a pool of worker threads
+    'asgi': ('asgi', True),         # async read views on the event loop
+    'asgi-sync': ('asgi', False),   # DRF views under ASGI, in Django's sync thread
+}
+
+
+def wsgi_request(handler, method, path, token, body=b''):
+    """Send one request through a WSGIHandler the way a server would; returns the status."""
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    content = handler(environ, lambda line, headers, exc_info=None: status.append(line))
+    try:
+        b''.join(content)
+    finally:
+        # What a WSGI server does; sends request_finished.
+        content.close()
+    return int(status[0].split()[0])
+
+
+class Command(BaseCommand):
+    help = ('Load the read endpoints with many concurrent clients through Django\'s WSGI and '
+            'ASGI handlers, in-process, and compare requests per second and latency. Each '
+            'mode runs in a subprocess, since ASYNC_READ_VIEWS is fixed at URL import.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500,
+                            help='Concurrent clients, each sending one request at a time.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads of the WSGI server being modelled.')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--modes', default='wsgi,asgi',
+                            help=f"Comma-separated, from: {', '.join(MODES)}.")
+        parser.add_argument('--only', help='Comma-separated scenario labels to run.')
+        parser.add_argument('--output', default='bench_concurrency.json')
+        parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **opts):
+        if opts['run_mode']:
+            results = asyncio.run(self.run_mode(opts['run_mode'], opts))
+            self.stdout.write(json.dumps(results))
+            return
+
+        modes = [mode.strip() for mode in opts['modes'].split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(unknown)}")
+        results = {mode: self.spawn(mode, opts) for mode in modes}
+
+        self.report(modes, results)
+        report = {'meta': self.meta(opts), 'results': results}
+        with open(opts['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+    def spawn(self, mode, opts):
+        self.stdout.write(f'Running {mode}...')
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_concurrency',
+                   '--run-mode', mode]
+        for option in ('clients', 'requests', 'threads', 'warmup', 'only'):
+            if opts[option] is not None:
+                command += [f"--{option}", str(opts[option])]
+        env = {**os.environ, 'LMS_ASYNC_READS': '1' if MODES[mode][1] else '0'}
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise CommandError(f'{mode} run failed:\n{proc.stderr}')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # ── One mode, in this process ────────────────────────────────────────────
+
+    async def run_mode(self, mode, opts):
+        handler, async_reads = MODES[mode]
+        if settings.ASYNC_READ_VIEWS != async_reads:
+            raise CommandError(f'{mode} needs LMS_ASYNC_READS={int(async_reads)}.')
+        scenarios, tokens = await asyncio.to_thread(self.setup, opts['only'])
+        if handler == 'wsgi':
+            pool = ThreadPoolExecutor(opts['threads'])
+            call = self.wsgi_caller(pool)
+        else:
+            call = self.asgi_caller()
+
+        results = {}
+        for scenario in scenarios:
+            token = tokens[scenario['actor']]
+            for _ in range(opts['warmup']):
+                await call(scenario['path'], token)
+            results[scenario['label']] = await self.load(
+                call, scenario['path'], token, opts['clients'], opts['requests'])
+        return results
+
+    def setup(self, only):
+        bench = EndpointBenchmark()
+        fixtures = bench.fixtures()
+        scenarios = [s for s in bench.scenarios(fixtures)
+                     if s['method'] == 'get' and s['route'] in READ_ROUTES]
+        if only:
+            wanted = set(only.split(','))
+            scenarios = [s for s in scenarios if s['label'] in wanted]
+        tokens = {actor: str(TokenObtainPairSerializer.get_token(user).access_token)
+                  for actor, user in fixtures['users'].items() if user is not None}
+        return [s for s in scenarios if s['actor'] in tokens], tokens
+
+    async def load(self, call, path, token, clients, total):
+        """`total` requests from `clients` closed-loop clients; latency includes queueing."""
+        pending = iter(range(total))
+        timings = []
+        statuses = Counter()
+
+        async def client():
+            for _ in pending:
+                start = time.perf_counter()
+                status = await call(path, token)
+                timings.append((time.perf_counter() - start) * 1000)
+                statuses[status] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        timings.sort()
+        return {
+            'path': path,
+            'statuses': {str(status): n for status, n in statuses.items()},
+            'rps': round(total / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+        }
+
+    def wsgi_caller(self, pool):
+        handler = WSGIHandler()
+
+        async def call(path, token):
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, wsgi_request, handler, 'GET', path, token)
+        return call
+
+    def asgi_caller(self):
+        handler = ASGIHandler()
+
+        async def call(path, token):
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'testserver'),
+                            (b'authorization', f'Bearer {token}'.encode())],
+                'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+            }
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            await handler(scope, receive, send)
+            return sent[0]['status']
+        return call
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+
+    def report(self, modes, results):
+        labels = list(results[modes[0]])
+        header = ''.join(f'{mode + " rps":>14}{"p99 ms":>10}' for mode in modes)
+        self.stdout.write(f"\n{'scenario':<28}{header}")
+        for label in labels:
+            row = ''.join(f"{results[mode][label]['rps']:>14.1f}{results[mode][label]['p99_ms']:>10.1f}"
+                          for mode in modes)
+            self.stdout.write(f'{label:<28}{row}')
+            for mode in modes:
+                errors = {s: n for s, n in results[mode][label]['statuses'].items() if s != '200'}
+                if errors:
+                    self.stderr.write(self.style.WARNING(f'  {mode}: non-200 responses {errors}'))
+
+    def meta(self, opts):
+        return {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'clients': opts['clients'],
+            'requests': opts['requests'],
+            'wsgi_threads': opts['threads'],
+            'database': settings.DATABASES['default']['ENGINE'],
+        }
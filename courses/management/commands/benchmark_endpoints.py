@@ -0,0 +1,229 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+import accounts.urls
+from accounts.serializers import TokenObtainPairSerializer
+import courses.urls
+from courses.models import Course, Submission
+
+
+class Rollback(Exception):
+    """Raised to undo a write request once it has been measured."""
+
+
+class Command(BaseCommand):
+    help = ('Drive every route in courses/urls.py and accounts/urls.py through the test '
+            'client against the current database and write latency/query stats as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default='bench_output.json')
+        parser.add_argument('--compare', help='Earlier output file to diff p50 and queries against.')
+        parser.add_argument('--only', help='Comma-separated scenario labels to run.')
+
+    def handle(self, *args, **opts):
+        fixtures = self.fixtures()
+        scenarios = self.scenarios(fixtures)
+        self.check_coverage(scenarios)
+        if opts['only']:
+            wanted = set(opts['only'].split(','))
+            scenarios = [s for s in scenarios if s['label'] in wanted]
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario['label']] = self.run(scenario, fixtures, opts['iterations'], opts['warmup'])
+            r = results[scenario['label']]
+            self.stdout.write(f"{scenario['label']:<32} {r['status']:>3}  p50 {r['p50_ms']:8.2f} ms  "
+                              f"p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  "
+                              f"queries {r['queries']:>3}  {r['bytes']} B")
+
+        report = {'meta': self.meta(opts), 'results': results}
+        with open(opts['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+        if opts['compare']:
+            self.compare(opts['compare'], results)
+
+    # ── Setup ────────────────────────────────────────────────────────────────
+
+    def fixtures(self):
+        User = get_user_model()
+        course = (Course.objects.filter(is_published=True, student_count__gt=0,
+                                        assignment_count__gt=0, lesson_count__gt=0)
+                  .order_by('-student_count').first())
+        if course is None:
+            raise CommandError('No populated course found; run generate_load_data first.')
+        student = course.students.order_by('pk').first()
+        submission = (Submission.objects.filter(assignment__course=course, student=student)
+                      .order_by('pk').first()
+                      or Submission.objects.filter(assignment__course=course).order_by('pk').first())
+        admin = User.objects.filter(is_staff=True).order_by('pk').first()
+        return {
+            'course': course,
+            'lesson': course.lessons.order_by('pk').first(),
+            'assignment': course.assignments.order_by('pk').first(),
+            'submission': submission,
+            'users': {'student': student, 'instructor': course.instructor, 'admin': admin},
+            'roster': list(course.students.order_by('pk').values_list('username', flat=True)[:200]),
+            'word': course.title.split()[1] if len(course.title.split()) > 1 else course.title,
+        }
+
+    def scenarios(self, f):
+        c, a, s, lesson = f['course'], f['assignment'], f['submission'], f['lesson']
+
+        def scenario(label, route, actor, method='get', kwargs=None, data=None,
+                     query='', write=False, stream=False):
+            return {'label': label, 'route': route, 'actor': actor, 'method': method,
+                    'path': reverse(route, kwargs=kwargs) + query, 'data': data,
+                    'write': write, 'stream': stream}
+
+        return [
+            scenario('course-list', 'course-list', 'student'),
+            scenario('course-create', 'course-list', 'instructor', 'post',
+                     data={'title': 'Bench', 'description': 'bench'}, write=True),
+            scenario('course-detail', 'course-detail', 'student', kwargs={'pk': c.pk}),
+            scenario('course-update', 'course-detail', 'instructor', 'patch',
+                     kwargs={'pk': c.pk}, data={'title': c.title}, write=True),
+            scenario('course-enroll', 'course-enroll', 'student', 'put',
+                     kwargs={'pk': c.pk}, write=True),
+            scenario('course-roster', 'course-roster', 'instructor', 'post',
+                     kwargs={'pk': c.pk}, data=f['roster'], write=True),
+            scenario('my-courses-student', 'my-courses', 'student'),
+            scenario('my-courses-instructor', 'my-courses', 'instructor'),
+            scenario('course-search', 'course-search', 'student', query=f"?q={f['word']}"),
+            scenario('course-gradebook', 'course-gradebook', 'instructor', kwargs={'pk': c.pk}),
+            scenario('course-analytics', 'course-analytics', 'instructor', kwargs={'pk': c.pk}),
+            scenario('course-submission-export', 'course-submission-export', 'instructor',
+                     kwargs={'pk': c.pk}, query='?format=ndjson', stream=True),
+            scenario('lesson-list', 'lesson-list', 'student', kwargs={'course_id': c.pk}),
+            scenario('lesson-detail', 'lesson-detail', 'student',
+                     kwargs={'course_id': c.pk, 'pk': lesson.pk}),
+            scenario('assignment-list-student', 'assignment-list', 'student'),
+            scenario('assignment-list-instructor', 'assignment-list', 'instructor'),
+            scenario('my-assignments', 'my-assignments', 'student'),
+            scenario('assignment-detail', 'assignment-detail', 'student', kwargs={'pk': a.pk}),
+            scenario('submission-list-student', 'submission-list', 'student'),
+            scenario('submission-list-instructor', 'submission-list', 'instructor'),
+            scenario('submission-detail', 'submission-detail', 'instructor', kwargs={'pk': s.pk}),
+            scenario('submission-grade', 'submission-detail', 'instructor', 'patch',
+                     kwargs={'pk': s.pk}, data={'score': 1}, write=True),
+            scenario('submission-bulk-grade', 'submission-bulk-grade', 'instructor', 'patch',
+                     data=[{'id': s.pk, 'score': 1}], write=True),
+            scenario('register', 'register', None, 'post', data={
+                'username': 'bench_register', 'password': 'bench-password-1',
+                'password2': 'bench-password-1', 'role': 'student'}, write=True),
+            scenario('profile', 'profile', 'student'),
+            scenario('user-list', 'user-list', 'admin'),
+        ]
+
+    def check_coverage(self, scenarios):
+        covered = {s['route'] for s in scenarios}
+        routes = {p.name for p in courses.urls.urlpatterns + accounts.urls.urlpatterns}
+        missing = sorted(routes - covered)
+        if missing:
+            self.stderr.write(self.style.WARNING(f"Routes without a scenario: {', '.join(missing)}"))
+
+    # ── Measurement ──────────────────────────────────────────────────────────
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            token = TokenObtainPairSerializer.get_token(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def request(self, client, scenario):
+        response = getattr(client, scenario['method'])(scenario['path'], scenario['data'],
+                                                       format='json')
+        if scenario['stream']:
+            response.size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            response.size = len(response.content)
+        return response
+
+    def run(self, scenario, fixtures, iterations, warmup):
+        actor = scenario['actor']
+        user = fixtures['users'].get(actor) if actor else None
+        if actor and user is None:
+            return {'skipped': f'no {actor} user', 'status': 0, 'p50_ms': 0, 'p95_ms': 0,
+                    'p99_ms': 0, 'mean_ms': 0, 'queries': 0, 'bytes': 0}
+        client = self.client_for(user)
+        timings = []
+        queries = status = size = None
+        for i in range(warmup + iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        response = self.request(client, scenario)
+                        if scenario['write']:
+                            raise Rollback
+                except Rollback:
+                    pass
+                elapsed = time.perf_counter() - start
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries, status = len(ctx.captured_queries), response.status_code
+                size = response.size
+        timings.sort()
+        return {
+            'method': scenario['method'].upper(),
+            'path': scenario['path'],
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': queries,
+            'bytes': size,
+        }
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+
+    def meta(self, opts):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, cwd=settings.BASE_DIR).stdout.strip()
+        except OSError:
+            commit = ''
+        return {
+            'commit': commit,
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'iterations': opts['iterations'],
+            'database': connection.vendor,
+            'courses': Course.objects.count(),
+            'submissions': Submission.objects.count(),
+        }
+
+    def compare(self, path, results):
+        with open(path) as fh:
+            baseline = json.load(fh)['results']
+        self.stdout.write(f"\nComparison against {path} (p50 / queries / bytes):")
+        for label, result in results.items():
+            before = baseline.get(label)
+            if not before or not before.get('p50_ms'):
+                continue
+            ratio = result['p50_ms'] / before['p50_ms']
+            flag = self.style.ERROR if ratio > 1.2 else self.style.SUCCESS if ratio < 0.8 else str
+            self.stdout.write(flag(
+                f"{label:<32} {before['p50_ms']:8.2f} -> {result['p50_ms']:8.2f} ms "
+                f"({ratio:5.2f}x)  queries {before['queries']} -> {result['queries']}  "
+                f"bytes {before.get('bytes', '?')} -> {result['bytes']}"))
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
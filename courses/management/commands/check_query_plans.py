@@ -0,0 +1,114 @@
+import re
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .benchmark_concurrency import READ_ROUTES
+from .benchmark_endpoints import Command as EndpointBenchmark, Rollback
+
+# `SCAN t` alone is a full table scan. `SCAN t USING [COVERING] INDEX i`
+# walks a whole index in order: fine when the statement has a LIMIT to stop
+# at, which is how the keyset pages are meant to be served, and a full scan
+# by another name otherwise.
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?: AS \S+)?$')
+INDEX_SCAN = re.compile(r'^SCAN (\S+)(?: AS \S+)? USING ')
+LIMITED = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+TEMP_SORT = 'USE TEMP B-TREE'
+
+# Tables whose whole index may be walked without a LIMIT.
+INDEX_SCAN_ALLOWED = set()
+
+
+# Lists merging rows from several courses cannot be read off a single index
+# in page order. Their sort input is only the caller's own rows, found by
+# index, so a temp B-tree is expected there; a full scan still fails.
+MERGED_LISTS = {'assignment-list-student', 'assignment-list-instructor', 'my-assignments',
+                'submission-list-instructor'}
+
+
+def scans(detail, sql):
+    if FULL_SCAN.match(detail):
+        return True
+    walk = INDEX_SCAN.match(detail)
+    return bool(walk) and walk[1] not in INDEX_SCAN_ALLOWED and not LIMITED.search(sql)
+
+
+def problems(plan, sql, sort_allowed=False):
+    return [detail for detail in plan
+            if scans(detail, sql) or (TEMP_SORT in detail and not sort_allowed)]
+
+
+class Command(BaseCommand):
+    help = ('Replay the list/detail GET routes against the current (populated) SQLite '
+            'database, run EXPLAIN QUERY PLAN on each statement they issue, and fail on full '
+            'table scans, unlimited index scans and temp B-tree sorts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Check every GET route, not just the list/detail reads.')
+        parser.add_argument('--only', help='Comma-separated scenario labels to check.')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Print the plan of every statement, not just failing ones.')
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plans are only checked on SQLite.')
+        bench = EndpointBenchmark()
+        fixtures = bench.fixtures()
+        scenarios = [s for s in bench.scenarios(fixtures) if s['method'] == 'get'
+                     and (opts['all'] or s['route'] in READ_ROUTES)]
+        if opts['only']:
+            wanted = set(opts['only'].split(','))
+            scenarios = [s for s in scenarios if s['label'] in wanted]
+
+        failed = []
+        for scenario in scenarios:
+            statements = self.capture(bench, scenario, fixtures)
+            bad = 0
+            for sql in statements:
+                plan = self.explain(sql)
+                found = problems(plan, sql, sort_allowed=scenario['label'] in MERGED_LISTS)
+                if found or opts['verbose_plans']:
+                    self.stdout.write(f"  {sql[:160]}")
+                    for detail in plan:
+                        style = self.style.ERROR if detail in found else str
+                        self.stdout.write(style(f"      {detail}"))
+                bad += bool(found)
+            label = f"{scenario['label']:<32} {len(statements):>3} statements"
+            if bad:
+                failed.append(scenario['label'])
+                self.stdout.write(self.style.ERROR(f'{label}  {bad} with scans or sorts'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label}  ok'))
+
+        if failed:
+            raise CommandError(f"Plans with full scans or temp B-tree sorts: {', '.join(failed)}")
+
+    def capture(self, bench, scenario, fixtures):
+        user = fixtures['users'].get(scenario['actor'])
+        if user is None:
+            return []
+        client = bench.client_for(user)
+        # Start cold, so cached views issue their queries.
+        for alias in ('default', 'responses', 'local', 'shared'):
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as ctx:
+            try:
+                with transaction.atomic():
+                    response = bench.request(client, scenario)
+                    # A later page too: its keyset filter must seek, not scan.
+                    following = getattr(response, 'data', None)
+                    if isinstance(following, dict) and following.get('next'):
+                        client.get(following['next'])
+                    raise Rollback
+            except Rollback:
+                pass
+        return [q['sql'] for q in ctx.captured_queries
+                if q['sql'].lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
@@ -0,0 +1,168 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from courses import search
+from courses.models import Course, Lesson, Assignment, Submission
+
+WORDS = (
+    'python django model view query index cache course lesson assignment student '
+    'grade score function loop class object database request response server '
+    'client design pattern test deploy scale stream batch event signal token '
+    'analysis data structure algorithm network security theory practice review'
+).split()
+
+
+def text(rng, min_words, max_words):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(min_words, max_words)))
+
+
+class TextPool:
+    """
+    Pre-generated bodies to draw from. Building a fresh random essay for each
+    of millions of rows would dominate the run time.
+    """
+    def __init__(self, rng, min_words, max_words, size=500):
+        self.rng = rng
+        self.texts = [text(rng, min_words, max_words) for _ in range(size)]
+
+    def __call__(self):
+        return self.rng.choice(self.texts)
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset with bulk inserts, for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Students to create.')
+        parser.add_argument('--instructors', type=int, default=None,
+                            help='Instructors to create (default: courses / 5, at least 1).')
+        parser.add_argument('--courses', type=int, default=50)
+        parser.add_argument('--lessons', type=int, default=20, help='Lessons per course.')
+        parser.add_argument('--assignments', type=int, default=10, help='Assignments per course.')
+        parser.add_argument('--enrollments', type=int, default=200,
+                            help='Students enrolled per course (capped at --users).')
+        parser.add_argument('--submission-rate', type=float, default=0.7,
+                            help='Chance an enrolled student submitted each assignment.')
+        parser.add_argument('--graded-rate', type=float, default=0.6,
+                            help='Chance a submission has been graded.')
+        parser.add_argument('--prefix', default='load',
+                            help='Username/title prefix, so several datasets can coexist.')
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        prefix = opts['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with prefix "{prefix}_" already exist; pick another --prefix.')
+
+        rng = random.Random(opts['seed'])
+        batch = opts['batch_size']
+        n_instructors = opts['instructors'] or max(1, opts['courses'] // 5)
+        started = time.perf_counter()
+        # Hashing is deliberately slow; do it once and share the result.
+        password = make_password(opts['password'])
+
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=f'{prefix}_inst{i}', email=f'{prefix}_inst{i}@example.com',
+                      role='instructor', password=password) for i in range(n_instructors)]
+                + [User(username=f'{prefix}_stu{i}', email=f'{prefix}_stu{i}@example.com',
+                        role='student', password=password) for i in range(opts['users'])],
+                batch_size=batch)
+            users = User.objects.filter(username__startswith=f'{prefix}_')
+            instructor_ids = list(users.filter(role='instructor').values_list('id', flat=True))
+            student_ids = list(users.filter(role='student').values_list('id', flat=True))
+            self.report('users', len(instructor_ids) + len(student_ids), started)
+
+            Course.objects.bulk_create(
+                [Course(title=f'{prefix} {text(rng, 2, 5).title()} {i}',
+                        description=text(rng, 30, 120),
+                        instructor_id=rng.choice(instructor_ids),
+                        is_published=rng.random() > 0.05) for i in range(opts['courses'])],
+                batch_size=batch)
+            course_ids = list(Course.objects.filter(instructor_id__in=instructor_ids)
+                              .values_list('id', flat=True))
+            self.report('courses', len(course_ids), started)
+
+            lesson_bodies = TextPool(rng, 100, 800)
+            self.bulk(Lesson, (
+                Lesson(course_id=course_id, title=text(rng, 2, 6).capitalize(),
+                       content=lesson_bodies(), order=order)
+                for course_id in course_ids for order in range(opts['lessons'])
+            ), batch, 'lessons', started)
+
+            now = timezone.now()
+            self.bulk(Assignment, (
+                Assignment(course_id=course_id, title=text(rng, 2, 5).capitalize(),
+                           description=text(rng, 20, 150),
+                           due_date=now + timedelta(days=rng.randint(-60, 60)),
+                           max_score=rng.choice((10, 20, 50, 100)))
+                for course_id in course_ids for _ in range(opts['assignments'])
+            ), batch, 'assignments', started)
+
+            per_course = min(opts['enrollments'], len(student_ids))
+            roster = {course_id: rng.sample(student_ids, per_course) for course_id in course_ids}
+            Enrollment = Course.students.through
+            self.bulk(Enrollment, (
+                Enrollment(course_id=course_id, user_id=user_id)
+                for course_id, members in roster.items() for user_id in members
+            ), batch, 'enrollments', started)
+
+            assignments = list(Assignment.objects.filter(course_id__in=course_ids)
+                               .values_list('id', 'course_id', 'max_score'))
+
+            essays, remarks = TextPool(rng, 50, 600), TextPool(rng, 5, 30)
+
+            def submissions():
+                for assignment_id, course_id, max_score in assignments:
+                    for user_id in roster[course_id]:
+                        if rng.random() >= opts['submission_rate']:
+                            continue
+                        graded = rng.random() < opts['graded_rate']
+                        yield Submission(
+                            assignment_id=assignment_id, student_id=user_id,
+                            content=essays(),
+                            status='graded' if graded else 'submitted',
+                            score=rng.randint(0, max_score) if graded else None,
+                            feedback=remarks() if graded else '')
+
+            self.bulk(Submission, submissions(), batch, 'submissions', started)
+
+            # bulk_create skips signals: fix counters and the search index in bulk.
+            Course.objects.filter(pk__in=course_ids).recount()
+        if search.is_supported():
+            search.rebuild()
+            self.report('search index', None, started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.perf_counter() - started:.1f}s. '
+            f'Log in as {prefix}_inst0 / {prefix}_stu0 with password "{opts["password"]}".'))
+
+    def bulk(self, model, objects, batch, label, started):
+        """bulk_create from a generator without materializing it all at once."""
+        total = 0
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= batch:
+                model.objects.bulk_create(chunk, batch_size=batch)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            model.objects.bulk_create(chunk, batch_size=batch)
+            total += len(chunk)
+        self.report(label, total, started)
+
+    def report(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        suffix = f': {count}' if count is not None else ''
+        self.stdout.write(f'[{elapsed:7.1f}s] {label}{suffix}')
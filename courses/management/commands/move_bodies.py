@@ -0,0 +1,139 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+
+from courses import bodies
+from courses.models import Body, Lesson, Submission
+from courses.serializers import LessonSerializer, SubmissionSerializer
+
+SERIALIZERS = {Lesson: LessonSerializer, Submission: SubmissionSerializer}
+
+
+class Command(BaseCommand):
+    help = ('Move existing lesson and submission bodies of BODY_STORE_MIN_LENGTH characters or '
+            'more into the body store (or back inline with --inline), and delete bodies '
+            'nothing refers to.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows rewritten per transaction (default 500).')
+        parser.add_argument('--inline', action='store_true',
+                            help='Move stored bodies back into their rows.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the rows that would move without changing them.')
+        parser.add_argument('--measure', action='store_true',
+                            help='Report database size and list query times before and after.')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM afterwards, so the file shrinks (rewrites the database).')
+
+    def handle(self, *args, **options):
+        limit = bodies.min_length()
+        if limit is None and not options['inline']:
+            raise CommandError('BODY_STORE_MIN_LENGTH is None; the body store is off.')
+        before = self.measure() if options['measure'] else None
+
+        for model in SERIALIZERS:
+            if options['inline']:
+                moved = self.move_inline(model, options['batch_size'], options['dry_run'])
+            else:
+                moved = self.move_out(model, limit, options['batch_size'], options['dry_run'])
+            verb = 'Would move' if options['dry_run'] else 'Moved'
+            where = 'inline' if options['inline'] else 'to the body store'
+            self.stdout.write(f'{verb} {moved} {model._meta.verbose_name} bodies {where}.')
+
+        if not options['dry_run']:
+            pruned = self.prune()
+            self.stdout.write(f'Deleted {pruned} unreferenced bodies; '
+                              f'{Body.objects.count()} stored.')
+            if options['vacuum'] and connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM')
+        if before is not None:
+            self.report(before, self.measure())
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def batches(self, queryset, batch_size):
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield batch
+
+    def move_out(self, model, limit, batch_size, dry_run):
+        pending = (model.objects.filter(content_body__isnull=True)
+                   .annotate(length=Length('content')).filter(length__gte=limit)
+                   .only('pk', 'content', 'content_body'))
+        if dry_run:
+            return pending.count()
+        moved = 0
+        for batch in self.batches(pending, batch_size):
+            with transaction.atomic():
+                digests = bodies.put_many([row.content for row in batch])
+                for row, digest in zip(batch, digests):
+                    row.content = row.content[:bodies.PREVIEW_LENGTH]
+                    row.content_body_id = digest
+                # Not save(): the text is unchanged, so `updated_at` stays.
+                model.objects.bulk_update(batch, ['content', 'content_body'])
+            moved += len(batch)
+        return moved
+
+    def move_inline(self, model, batch_size, dry_run):
+        stored = model.objects.filter(content_body__isnull=False).only('pk', 'content_body')
+        if dry_run:
+            return stored.count()
+        moved = 0
+        for batch in self.batches(stored, batch_size):
+            with transaction.atomic():
+                texts = bodies.get_many(row.content_body_id for row in batch)
+                for row in batch:
+                    row.content = texts[row.content_body_id]
+                    row.content_body_id = None
+                model.objects.bulk_update(batch, ['content', 'content_body'])
+            moved += len(batch)
+        return moved
+
+    def prune(self):
+        unreferenced = Body.objects.all()
+        for model in SERIALIZERS:
+            unreferenced = unreferenced.exclude(
+                pk__in=model.objects.filter(content_body__isnull=False).values('content_body'))
+        deleted, _ = unreferenced.delete()
+        return deleted
+
+    # ── Measurement ──────────────────────────────────────────────────────────
+
+    def measure(self):
+        results = {}
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                pages = [cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                         for name in ('page_count', 'freelist_count', 'page_size')]
+            results['database MB (used pages)'] = (pages[0] - pages[1]) * pages[2] / 1024 ** 2
+        for model, serializer in SERIALIZERS.items():
+            name = model._meta.verbose_name
+            # What a list view reads: every column but the body, plus `excerpt`.
+            page = serializer.sparse_queryset(model.objects.order_by('-pk'), {}, listing=True)
+            results[f'{name} list page ms'] = best_of(lambda: list(page[:100]))
+            # A scan over every row, reading a column stored after the body.
+            results[f'{name} full scan ms'] = best_of(
+                lambda: model.objects.aggregate(Max('updated_at')))
+        return results
+
+    def report(self, before, after):
+        self.stdout.write(f"\n{'':<32}{'before':>12}{'after':>12}")
+        for label, value in before.items():
+            self.stdout.write(f'{label:<32}{value:>12.1f}{after[label]:>12.1f}')
+
+
+def best_of(run, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
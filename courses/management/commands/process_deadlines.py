@@ -0,0 +1,57 @@
+import argparse
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from courses.deadlines import process_deadlines
+from courses.sync import parse_since
+
+# Re-cover the end of the previous pass, for submissions still in flight then.
+OVERLAP = timedelta(minutes=5)
+
+
+def timestamp(value):
+    try:
+        return parse_since(value)
+    except ValidationError:
+        raise argparse.ArgumentTypeError('expected an ISO 8601 timestamp')
+
+
+class Command(BaseCommand):
+    help = ("Mark submissions made after their assignment's due date 'late' and add 'missing' "
+            "placeholders for enrolled students who submitted nothing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=timestamp,
+                            help='Process assignments due after this ISO 8601 timestamp '
+                                 '(default: --days ago).')
+        parser.add_argument('--days', type=int, default=7,
+                            help='Look back this many days when --since is not given (default 7).')
+        parser.add_argument('--window-hours', type=int, default=24,
+                            help='Due-date window processed per transaction (default 24).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Placeholders inserted per statement (default 1000).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would change without writing.')
+        parser.add_argument('--every', type=int, metavar='SECONDS',
+                            help='Keep running, processing newly passed deadlines every SECONDS.')
+
+    def handle(self, *args, **options):
+        since = options['since'] or timezone.now() - timedelta(days=options['days'])
+        while True:
+            until = timezone.now()
+            late, missing = process_deadlines(
+                since, until, window=timedelta(hours=options['window_hours']),
+                batch_size=options['batch_size'], dry_run=options['dry_run'],
+            )
+            verb = 'Would mark' if options['dry_run'] else 'Marked'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {late} submission(s) late and {missing} missing '
+                f'(due {since:%Y-%m-%d %H:%M} to {until:%Y-%m-%d %H:%M}).'))
+            if not options['every']:
+                break
+            since = until - OVERLAP
+            time.sleep(options['every'])
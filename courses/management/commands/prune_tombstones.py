@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import Tombstone
+from courses.sync import TOMBSTONE_RETENTION
+
+
+class Command(BaseCommand):
+    help = 'Delete tombstones older than the delta sync retention window.'
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(
+            deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstone(s).'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over courses, lessons and assignments.'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Full-text search requires the SQLite backend (FTS5).')
+        total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} document(s).'))
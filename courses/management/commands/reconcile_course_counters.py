@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from courses import caching
+from courses.models import Course, counter_expressions
+
+
+class Command(BaseCommand):
+    help = 'Find and fix drift in the denormalized Course counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Courses checked per transaction (default 500).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted courses without updating them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            batch = list(Course.objects.filter(pk__gt=last_pk)
+                         .order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]
+            checked += len(batch)
+
+            with transaction.atomic():
+                actual = {f'_{name}': expr for name, expr in counter_expressions().items()}
+                mismatch = Q()
+                for name in Course.COUNTER_FIELDS:
+                    mismatch |= ~Q(**{name: F(f'_{name}')})
+                drifted = (Course.objects.filter(pk__in=batch)
+                           .annotate(**actual)
+                           .filter(mismatch)
+                           .values('pk', 'title', *Course.COUNTER_FIELDS, *actual))
+                drifted = list(drifted)
+                for row in drifted:
+                    changes = ', '.join(
+                        f"{name} {row[name]} -> {row[f'_{name}']}"
+                        for name in Course.COUNTER_FIELDS if row[name] != row[f'_{name}'])
+                    self.stdout.write(f"Course {row['pk']} ({row['title']}): {changes}")
+                if drifted and not dry_run:
+                    # Recompute inside the UPDATE so writes racing with the
+                    # check above are not overwritten with stale numbers.
+                    fixed_ids = [row['pk'] for row in drifted]
+                    Course.objects.filter(pk__in=fixed_ids).recount()
+                    caching.touch_courses(fixed_ids)
+                fixed += len(drifted)
+
+        verb = 'Found' if dry_run else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {fixed} drifted course(s) out of {checked} checked.'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses import analytics
+
+
+class Command(BaseCommand):
+    help = ('Update the course analytics rollups from submissions, assignments and enrollment '
+            'counts changed since the last run (all of them with --full).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every assignment, ignoring the watermark.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Assignments recomputed per transaction (default 500).')
+        parser.add_argument('--every', type=int, metavar='SECONDS',
+                            help='Keep running, refreshing every SECONDS.')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            since = None if full else analytics.last_refresh()
+            assignments, courses = analytics.refresh(full=full, batch_size=options['batch_size'])
+            scope = f'since {since:%Y-%m-%d %H:%M}' if since else 'in full'
+            self.stdout.write(self.style.SUCCESS(
+                f'Refreshed {assignments} assignment(s) and the enrollment of '
+                f'{courses} course(s) {scope}.'))
+            if not options['every']:
+                break
+            full = False
+            time.sleep(options['every'])
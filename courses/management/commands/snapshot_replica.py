@@ -0,0 +1,31 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the SQLite primary into the file behind a replica alias, a stand-in '
+            'replica for local testing. Reads through it lag by the time since the last copy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica',
+                            help='Replica alias to refresh (default "replica").')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in settings.REPLICA_DATABASES:
+            raise CommandError(f'{alias!r} is not in REPLICA_DATABASES.')
+        primary = connections['default']
+        if primary.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError('Snapshots are only taken between SQLite databases.')
+        primary.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            # Online backup: consistent even while the primary is being written.
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {primary.settings_dict['NAME']} to {connections[alias].settings_dict['NAME']}."))
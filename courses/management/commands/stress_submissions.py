@@ -0,0 +1,198 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.serializers import TokenObtainPairSerializer
+from courses import search
+from courses.models import Assignment, Course, Submission
+from .benchmark_concurrency import wsgi_request
+from .benchmark_endpoints import percentile
+
+
+class Command(BaseCommand):
+    help = ('Submit assignments from many concurrent clients, with readers listing submissions '
+            'meanwhile, once per database profile (LMS_DB_PROFILE), and compare write '
+            'throughput and the "database is locked" error rate. Each profile runs in a '
+            'subprocess against a scratch database, so the real one is never touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='default,production',
+                            help='Comma-separated, from settings.DATABASE_PROFILES.')
+        parser.add_argument('--writers', type=int, default=16, help='Concurrent submitting clients.')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Concurrent clients listing submissions while the writers run.')
+        parser.add_argument('--submissions', type=int, default=2000)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--output', default='stress_submissions.json')
+        parser.add_argument('--run-profile', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **opts):
+        if opts['run_profile']:
+            self.stdout.write(json.dumps(self.run_profile(opts['run_profile'], opts)))
+            return
+
+        profiles = [p.strip() for p in opts['profiles'].split(',') if p.strip()]
+        unknown = [p for p in profiles if p not in settings.DATABASE_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}")
+        results = {profile: self.spawn(profile, opts) for profile in profiles}
+
+        self.report(results)
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                **{option: opts[option] for option in ('writers', 'readers', 'submissions',
+                                                       'students')},
+            },
+            'results': results,
+        }
+        with open(opts['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {opts['output']}"))
+
+    def spawn(self, profile, opts):
+        self.stdout.write(f'Running {profile}...')
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'stress_submissions',
+                   '--run-profile', profile]
+        for option in ('writers', 'readers', 'submissions', 'students'):
+            command += [f'--{option}', str(opts[option])]
+        env = {**os.environ, 'LMS_DB_PROFILE': profile}
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise CommandError(f'{profile} run failed:\n{proc.stderr}')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # ── One profile, in this process ─────────────────────────────────────────
+
+    def run_profile(self, profile, opts):
+        if settings.DATABASE_PROFILE != profile:
+            raise CommandError(f'{profile} needs LMS_DB_PROFILE={profile}.')
+        with tempfile.TemporaryDirectory() as scratch:
+            # The settings dict is shared by every thread's connection.
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(scratch, 'stress.sqlite3')
+            self.create_schema()
+            instructor, pairs = self.fixtures(opts['students'], opts['submissions'])
+            results = self.load(instructor, pairs, opts['writers'], opts['readers'])
+            results['rows'] = Submission.objects.count()
+            connection.close()
+        return results
+
+    def create_schema(self):
+        with connection.schema_editor() as editor:
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        search.ensure_index()
+        call_command('createcachetable', verbosity=0)
+
+    def fixtures(self, students, submissions):
+        User = get_user_model()
+        instructor = User.objects.create(username='stress_instructor', role='instructor')
+        course = Course.objects.create(title='Stress', description='Stress test',
+                                       instructor=instructor, is_published=True)
+        users = User.objects.bulk_create(
+            [User(username=f'stress_{i}', role='student') for i in range(students)])
+        course.students.add(*users)
+        due = timezone.now() + timedelta(days=1)
+        assignments = [
+            Assignment.objects.create(course=course, title=f'Stress {i}',
+                                      description='Stress test', due_date=due)
+            for i in range(math.ceil(submissions / students))
+        ]
+        tokens = [token(user) for user in users]
+        pairs = [(student_token, assignment.pk)
+                 for assignment in assignments for student_token in tokens][:submissions]
+        random.shuffle(pairs)
+        return token(instructor), pairs
+
+    def load(self, instructor, pairs, writers, readers):
+        handler = WSGIHandler()
+        path = reverse('submission-list')
+        errors = Counter()
+
+        def record(sender, **kwargs):
+            error = sys.exc_info()[1]
+            locked = isinstance(error, OperationalError) and 'locked' in str(error)
+            errors['locked' if locked else type(error).__name__] += 1
+
+        got_request_exception.connect(record, weak=False)
+        # The 500s are counted above; logging each one would drown the output.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        def submit(pair):
+            student_token, assignment_id = pair
+            body = json.dumps({'assignment': assignment_id, 'content': 'answer'}).encode()
+            start = time.perf_counter()
+            status = wsgi_request(handler, 'POST', path, student_token, body)
+            return status, (time.perf_counter() - start) * 1000
+
+        done = threading.Event()
+        reads = Counter()
+
+        def read():
+            while not done.is_set():
+                reads[wsgi_request(handler, 'GET', path, instructor)] += 1
+
+        reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+        for thread in reader_threads:
+            thread.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(writers) as pool:
+            outcomes = list(pool.map(submit, pairs))
+        elapsed = time.perf_counter() - start
+        done.set()
+        for thread in reader_threads:
+            thread.join()
+
+        statuses = Counter(status for status, _ in outcomes)
+        timings = sorted(ms for _, ms in outcomes)
+        return {
+            'statuses': {str(status): n for status, n in statuses.items()},
+            'errors': dict(errors),
+            'created_per_s': round(statuses[201] / elapsed, 1),
+            'lock_error_rate': round(errors['locked'] / len(pairs), 4),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'reads_per_s': round(sum(reads.values()) / elapsed, 1),
+            'read_statuses': {str(status): n for status, n in reads.items()},
+        }
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+
+    def report(self, results):
+        self.stdout.write(f"\n{'profile':<14}{'created/s':>11}{'locked':>9}{'p50 ms':>9}"
+                          f"{'p99 ms':>9}{'reads/s':>10}")
+        for profile, r in results.items():
+            self.stdout.write(f"{profile:<14}{r['created_per_s']:>11.1f}"
+                              f"{r['lock_error_rate']:>9.1%}{r['p50_ms']:>9.1f}"
+                              f"{r['p99_ms']:>9.1f}{r['reads_per_s']:>10.1f}")
+            other = {name: n for name, n in r['errors'].items() if name != 'locked'}
+            if other:
+                self.stderr.write(self.style.WARNING(f'  {profile}: other errors {other}'))
+
+
+def token(user):
+    return str(TokenObtainPairSerializer.get_token(user).access_token)
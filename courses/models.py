@@ -1,5 +1,64 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    BooleanField, Count, Exists, ExpressionWrapper, F, IntegerField, OuterRef, Prefetch, Q,
+    Subquery, Value,
+)
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+
+from .bodies import BodyTextField, StoredBodyMixin, StoredBodyQuerySet
+
+
+def count_of(queryset, fk='course_id'):
+    """Correlated COUNT(*) of `queryset` rows pointing at the outer course."""
+    counted = (queryset.filter(**{fk: OuterRef('pk')})
+               .order_by().values(fk).annotate(n=Count('*')).values('n'))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def counter_expressions():
+    """The true value of each denormalized Course counter, as subqueries."""
+    return {
+        'student_count': count_of(Course.students.through.objects.all()),
+        'lesson_count': count_of(Lesson.objects.all()),
+        'assignment_count': count_of(Assignment.objects.all()),
+    }
+
+
+class CourseQuerySet(models.QuerySet):
+    # Counters are part of the course payload, so changing them moves
+    # `updated_at` too and delta sync (`?since=`) picks the course up.
+
+    def adjust_counter(self, field, delta):
+        """Atomically add `delta` to a counter column (`UPDATE ... x = x + n`)."""
+        if not delta:
+            return 0
+        return self.update(**{field: F(field) + delta}, updated_at=timezone.now())
+
+    def recount(self, *fields):
+        """Recompute counters from the rows they count, in one UPDATE."""
+        expressions = counter_expressions()
+        return self.update(**{field: expressions[field] for field in fields or expressions},
+                           updated_at=timezone.now())
+
+    def with_enrollment(self, user):
+        """Annotate `is_enrolled` for `user`."""
+        if user is not None and user.is_authenticated:
+            enrolled = Exists(Course.students.through.objects.filter(
+                course_id=OuterRef('pk'), user_id=user.pk))
+        else:
+            enrolled = Value(False)
+        return self.annotate(is_enrolled=enrolled)
+
+    def with_detail(self, user):
+        """Everything CourseSerializer reads, in a fixed number of queries."""
+        return self.select_related('instructor').with_enrollment(user).prefetch_related(
+            Prefetch('lessons', queryset=Lesson.objects.select_related('content_body')),
+            Prefetch('assignments', queryset=Assignment.objects.all()),
+        )
 
 
 class Course(models.Model):
@@ -17,30 +76,123 @@ class Course(models.Model):
         blank=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_published = models.BooleanField(default=True)
+    # Denormalized counters, kept in sync by courses.signals.
+    # Repair drift with `manage.py reconcile_course_counters`.
+    student_count = models.PositiveIntegerField(default=0, editable=False)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    assignment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('student_count', 'lesson_count', 'assignment_count')
 
     class Meta:
         ordering = ['-created_at']
+        # Each list view's filter followed by its keyset ordering
+        # (courses/pagination.py), so pages come straight off the index.
+        # SQLite filters booleans as a bare `WHERE is_published`, which only
+        # a partial index matches.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_published=True),
+                         name='course_published_recent_idx'),
+            models.Index(fields=['instructor', '-created_at', '-id'],
+                         name='course_instructor_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Never write back counters read earlier; that would undo concurrent
+        # F() increments made since this instance was loaded.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    # Enrollment writes go straight to the through table so each is a single
+    # statement that relies on its unique (course, user) constraint rather
+    # than a racy exists()-then-add() pair.
+    def enroll(self, user):
+        """Enroll `user`; returns False if they were already enrolled."""
+        try:
+            with transaction.atomic():
+                Course.students.through.objects.create(course_id=self.pk, user_id=user.pk)
+                Course.objects.filter(pk=self.pk).adjust_counter('student_count', 1)
+        except IntegrityError:
+            return False
+        return True
 
-class Lesson(models.Model):
+    def unenroll(self, user):
+        """Unenroll `user`; returns False if they were not enrolled."""
+        with transaction.atomic():
+            removed, _ = Course.students.through.objects.filter(
+                course_id=self.pk, user_id=user.pk).delete()
+            Course.objects.filter(pk=self.pk).adjust_counter('student_count', -removed)
+        return bool(removed)
+
+
+class Body(models.Model):
+    """A long lesson or submission body, zlib-compressed, stored once per text (courses/bodies.py)."""
+    digest = models.CharField(max_length=64, primary_key=True)   # SHA-256 of the text
+    data = models.BinaryField()
+    length = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.length} chars)"
+
+
+class Lesson(StoredBodyMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
-    content = models.TextField()
+    content = BodyTextField()
+    # Set by `content` on save (bodies.StoredBodyMixin).
+    content_body = models.ForeignKey(Body, null=True, blank=True, editable=False,
+                                     on_delete=models.PROTECT, related_name='+')
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = StoredBodyQuerySet.as_manager()
 
     class Meta:
         ordering = ['order', 'created_at']
+        indexes = [
+            models.Index(fields=['course', 'order', 'created_at', 'id'],
+                         name='lesson_course_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
 
+class AssignmentQuerySet(models.QuerySet):
+    def with_submission(self, student):
+        """
+        Annotate `student`'s submission to each assignment: `submission_id`,
+        `submission_status` ('pending' when there is none), `score`,
+        `submitted_at`, and `overdue` (past due with nothing submitted, or
+        only the 'missing' placeholder left by process_deadlines).
+        """
+        mine = (Submission.objects.filter(assignment_id=OuterRef('pk'), student_id=student.pk)
+                .order_by())
+        return self.annotate(
+            submission_id=Subquery(mine.values('pk')[:1]),
+            submission_status=Coalesce(Subquery(mine.values('status')[:1]), Value('pending')),
+            score=Subquery(mine.values('score')[:1]),
+            submitted_at=Subquery(mine.values('submitted_at')[:1]),
+        ).annotate(overdue=ExpressionWrapper(
+            (Q(submission_id__isnull=True) | Q(submission_status='missing'))
+            & Q(due_date__lt=timezone.now()),
+            output_field=BooleanField(),
+        ))
+
+
 class Assignment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=200)
@@ -48,19 +200,27 @@ class Assignment(models.Model):
     due_date = models.DateTimeField()
     max_score = models.PositiveIntegerField(default=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AssignmentQuerySet.as_manager()
 
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            models.Index(fields=['course', 'due_date', 'id'], name='assignment_course_due_idx'),
+            models.Index(fields=['due_date', 'id'], name='assignment_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
 
-class Submission(models.Model):
+class Submission(StoredBodyMixin, models.Model):
     STATUS_CHOICES = (
         ('submitted', 'Submitted'),
         ('graded', 'Graded'),
         ('late', 'Late'),
+        ('missing', 'Missing'),
     )
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(
@@ -68,16 +228,124 @@ class Submission(models.Model):
         on_delete=models.CASCADE,
         related_name='submissions'
     )
-    content = models.TextField(help_text='Write your answer here')
+    content = BodyTextField(help_text='Write your answer here')
+    # Set by `content` on save (bodies.StoredBodyMixin).
+    content_body = models.ForeignKey(Body, null=True, blank=True, editable=False,
+                                     on_delete=models.PROTECT, related_name='+')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted')
     score = models.PositiveIntegerField(null=True, blank=True)
     feedback = models.TextField(blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = StoredBodyQuerySet.as_manager()
 
     class Meta:
         unique_together = ['assignment', 'student']
         ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['student', '-submitted_at', '-id'],
+                         name='submission_student_recent_idx'),
+            models.Index(fields=['assignment', '-submitted_at', '-id'],
+                         name='submission_assignment_rec_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.assignment.title}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, so `?since=` delta sync can report deletions.
+
+    Only ids are kept. `course_id` and `student_id` scope who is told about
+    the deletion; they are plain integers because the rows they pointed at
+    may be gone too.
+    """
+    KIND_CHOICES = (
+        ('course', 'Course'),
+        ('lesson', 'Lesson'),
+        ('assignment', 'Assignment'),
+        ('submission', 'Submission'),
+        # A student leaving a course: object_id is the course, student_id the student.
+        ('enrollment', 'Enrollment'),
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    course_id = models.PositiveBigIntegerField()
+    student_id = models.PositiveBigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'deleted_at'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class Watermark(models.Model):
+    """How far a periodic job has processed rows, by their `updated_at`."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} at {self.value:%Y-%m-%d %H:%M}"
+
+
+# ── Analytics rollups (courses/analytics.py) ─────────────────────────────────
+
+class CourseDailyStats(models.Model):
+    """A course's enrolled-student count, recorded on each day it changed."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    student_count = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['course', 'date']
+        verbose_name_plural = 'course daily stats'
+
+    def __str__(self):
+        return f"{self.course_id} on {self.date}: {self.student_count} students"
+
+
+class AssignmentDailyStats(models.Model):
+    """Submissions to an assignment per day they were submitted."""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    submitted = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['assignment', 'date']
+        verbose_name_plural = 'assignment daily stats'
+        indexes = [models.Index(fields=['course', 'date'], name='assignment_daily_course_idx')]
+
+    def __str__(self):
+        return f"{self.assignment_id} on {self.date}: {self.submitted} submitted"
+
+
+class AssignmentStats(models.Model):
+    """
+    Submission totals of an assignment. Ungraded rows are left out of
+    `histogram` (gradebook.HISTOGRAM_BUCKETS score buckets), so its sum is
+    the number of scores in `score_total`.
+    """
+    assignment = models.OneToOneField(Assignment, on_delete=models.CASCADE, primary_key=True,
+                                      related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    submitted = models.PositiveIntegerField(default=0)
+    graded = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    missing = models.PositiveIntegerField(default=0)
+    score_total = models.PositiveBigIntegerField(default=0)
+    histogram = models.JSONField(default=list)
+    # Sum over submissions of submitted_at - due_date (negative when early).
+    delay_total = models.DurationField(default=timedelta)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'assignment stats'
+
+    def __str__(self):
+        return f"{self.assignment_id}: {self.submitted} submitted"
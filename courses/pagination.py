@@ -0,0 +1,26 @@
+from backend.pagination import KeysetPagination
+
+
+# Each ordering mirrors the model's Meta.ordering plus an `id` tie-breaker.
+
+class CoursePagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class LessonPagination(KeysetPagination):
+    ordering = ('order', 'created_at', 'id')
+
+
+class AssignmentPagination(KeysetPagination):
+    ordering = ('due_date', 'id')
+
+
+class SubmissionPagination(KeysetPagination):
+    ordering = ('-submitted_at', '-id')
+
+
+class GradebookPagination(KeysetPagination):
+    """Student rows of the gradebook matrix."""
+    ordering = ('username', 'id')
+    page_size = 100
+    max_page_size = 500
@@ -0,0 +1,12 @@
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """Hand a `text/csv` request body to the view as a decoded string."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return stream.read().decode(encoding)
@@ -0,0 +1,144 @@
+"""
+SQLite FTS5 full-text index over courses, lessons and assignments.
+
+The index lives in a single `courses_search` virtual table. Each row's rowid
+encodes the object type and primary key (`pk * 4 + kind`) so signal-driven
+updates can replace one document by rowid instead of scanning the table.
+Course and enrollment visibility are applied by joining back to
+`courses_course` at query time, so visibility changes need no reindexing.
+"""
+from django.db import connection
+
+from . import bodies
+from .models import Course, Lesson, Assignment
+
+TABLE = 'courses_search'
+KINDS = {Course: 1, Lesson: 2, Assignment: 3}
+KIND_NAMES = {1: 'course', 2: 'lesson', 3: 'assignment'}
+# (model, kind, course id column, body column) for the bulk rebuild.
+SOURCES = [
+    (Course, 1, 'id', 'description'),
+    (Lesson, 2, 'course_id', 'content'),
+    (Assignment, 3, 'course_id', 'description'),
+]
+MAX_RESULTS = 50
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_index():
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "kind UNINDEXED, course_id UNINDEXED, title, body, "
+            "tokenize = 'porter unicode61')"
+        )
+
+
+def document(obj):
+    """(rowid, kind, course_id, title, body) for a Course, Lesson or Assignment."""
+    kind = KINDS[type(obj)]
+    if isinstance(obj, Course):
+        return obj.pk * 4 + kind, kind, obj.pk, obj.title, obj.description
+    body = bodies.text(obj) if isinstance(obj, Lesson) else obj.description
+    return obj.pk * 4 + kind, kind, obj.course_id, obj.title, body
+
+
+def index_object(obj):
+    if not is_supported():
+        return
+    row = document(obj)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [row[0]])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, kind, course_id, title, body) '
+            'VALUES (%s, %s, %s, %s, %s)', list(row))
+
+
+def remove_object(obj):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                       [obj.pk * 4 + KINDS[type(obj)]])
+
+
+def rebuild():
+    """Drop and repopulate the whole index; returns the number of documents."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        ensure_index()
+        total = 0
+        for model, kind, course_column, body_column in SOURCES:
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, kind, course_id, title, body) '
+                f'SELECT id * 4 + {kind}, {kind}, {course_column}, title, {body_column} '
+                f'FROM {model._meta.db_table}')
+            total += cursor.rowcount
+        # Lessons in the body store were indexed by their inline preview;
+        # index their full text instead.
+        stored = Lesson.objects.filter(content_body__isnull=False).select_related('content_body')
+        for lesson in stored.iterator(chunk_size=500):
+            index_object(lesson)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def match_expression(q):
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the
+    last one also matches as a prefix so results appear while typing.
+    """
+    words = [word.replace('"', '""') for word in q.split()]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(user, q, limit=20, offset=0):
+    """Ranked hits for `q` that `user` is allowed to see."""
+    match = match_expression(q)
+    if match is None:
+        return []
+
+    # Same rules as the list views: courses and their lessons when published
+    # (or taught by the user); assignments only for the course instructor or
+    # enrolled students.
+    if user.role == 'instructor':
+        assignment_visible = 'c.instructor_id = %s'
+    else:
+        assignment_visible = (
+            f'EXISTS (SELECT 1 FROM {Course.students.through._meta.db_table} e '
+            'WHERE e.course_id = c.id AND e.user_id = %s)')
+
+    sql = (
+        f"SELECT s.rowid, s.kind, s.course_id, c.title, s.title, "
+        f"snippet({TABLE}, 3, '<mark>', '</mark>', '…', 16), "
+        f"bm25({TABLE}, 0, 0, 10.0, 1.0) AS rank "
+        f"FROM {TABLE} s JOIN {Course._meta.db_table} c ON c.id = s.course_id "
+        f"WHERE {TABLE} MATCH %s AND ("
+        f"  (s.kind IN (1, 2) AND (c.is_published OR c.instructor_id = %s))"
+        f"  OR (s.kind = 3 AND {assignment_visible})"
+        f") ORDER BY rank LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, user.pk, user.pk, limit, offset])
+        rows = cursor.fetchall()
+    return [
+        {
+            'type': KIND_NAMES[kind],
+            'id': rowid // 4,
+            'course': course_id,
+            'course_title': course_title,
+            'title': title,
+            'snippet': snippet,
+            'rank': round(rank, 4),
+        }
+        for rowid, kind, course_id, course_title, title, snippet, rank in rows
+    ]
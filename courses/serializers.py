@@ -1,41 +1,110 @@
+from django.db.models.functions import Substr
 from rest_framework import serializers
+from . import bodies
+from .fieldsets import SparseFieldsSerializerMixin
 from .models import Course, Lesson, Assignment, Submission
 from accounts.serializers import UserSerializer
 
+EXCERPT_LENGTH = 200
+
+
+class BodyField(serializers.CharField):
+    """A BodyTextField's full text, loaded from the body store on first use."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('style', {'base_template': 'textarea.html'})
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return bodies.text(instance, self.source)
+
+
+class BodyListSerializer(serializers.ListSerializer):
+    """Loads the bodies of a whole page in one query before serializing it."""
+
+    def to_representation(self, data):
+        names = [field.source for field in self.child.fields.values()
+                 if isinstance(field, BodyField)]
+        if names and not isinstance(data, dict):
+            data = bodies.prefetch(data.all() if hasattr(data, 'all') else data, names)
+        return super().to_representation(data)
+
+
+# List responses carry `excerpt` (the first EXCERPT_LENGTH characters) in
+# place of the full body; ask for `?fields=...,content` to get it.
+
+class LessonSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    content = BodyField()
+    excerpt = serializers.CharField(read_only=True)
 
-class LessonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lesson
-        fields = ['id', 'course', 'title', 'content', 'order', 'created_at']
-        read_only_fields = ['created_at']
+        list_serializer_class = BodyListSerializer
+        fields = ['id', 'course', 'title', 'content', 'excerpt', 'order', 'created_at',
+                  'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+        list_omit = ['content']
+        list_only = ['excerpt']
+        annotations = {'excerpt': Substr('content', 1, EXCERPT_LENGTH)}
 
 
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     course_title = serializers.CharField(source='course.title', read_only=True)
 
     class Meta:
         model = Assignment
         fields = ['id', 'course', 'course_title', 'title', 'description',
-                  'due_date', 'max_score', 'created_at']
-        read_only_fields = ['created_at']
+                  'due_date', 'max_score', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class MyAssignmentSerializer(AssignmentSerializer):
+    """An assignment with the requesting student's submission state.
 
+    Expects a queryset built with `Assignment.objects.with_submission(user)`
+    and a `course_title` annotation.
+    """
+    course_title = serializers.CharField(read_only=True)
+    submission = serializers.IntegerField(source='submission_id', read_only=True)
+    status = serializers.CharField(source='submission_status', read_only=True)
+    score = serializers.IntegerField(read_only=True)
+    submitted_at = serializers.DateTimeField(read_only=True)
+    overdue = serializers.BooleanField(read_only=True)
 
-class SubmissionSerializer(serializers.ModelSerializer):
+    class Meta(AssignmentSerializer.Meta):
+        fields = AssignmentSerializer.Meta.fields + [
+            'submission', 'status', 'score', 'submitted_at', 'overdue']
+
+
+class SubmissionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     student_username = serializers.CharField(source='student.username', read_only=True)
     assignment_title = serializers.CharField(source='assignment.title', read_only=True)
+    content = BodyField(help_text='Write your answer here')
+    excerpt = serializers.CharField(read_only=True)
 
     class Meta:
         model = Submission
+        list_serializer_class = BodyListSerializer
         fields = ['id', 'assignment', 'assignment_title', 'student', 'student_username',
-                  'content', 'status', 'score', 'feedback', 'submitted_at', 'updated_at']
+                  'content', 'excerpt', 'status', 'score', 'feedback', 'submitted_at',
+                  'updated_at']
         read_only_fields = ['student', 'submitted_at', 'updated_at', 'status']
+        list_omit = ['content']
+        list_only = ['excerpt']
+        annotations = {'excerpt': Substr('content', 1, EXCERPT_LENGTH)}
+
 
+class BulkGradeItemSerializer(serializers.Serializer):
+    """One entry of a bulk grading request."""
+    id = serializers.IntegerField()
+    score = serializers.IntegerField(min_value=0)
+    feedback = serializers.CharField(required=False, allow_blank=True)
 
-class CourseSerializer(serializers.ModelSerializer):
+
+class CourseSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     instructor_name = serializers.CharField(source='instructor.username', read_only=True)
     lessons = LessonSerializer(many=True, read_only=True)
     assignments = AssignmentSerializer(many=True, read_only=True)
-    student_count = serializers.IntegerField(source='students.count', read_only=True)
     is_enrolled = serializers.SerializerMethodField()
 
     class Meta:
@@ -45,29 +114,27 @@ class CourseSerializer(serializers.ModelSerializer):
                   'is_published', 'created_at', 'updated_at']
         read_only_fields = ['instructor', 'created_at', 'updated_at']
 
+    # Prefer the annotation from `Course.objects.with_detail()`; freshly
+    # created instances fall back to a query.
     def get_is_enrolled(self, obj):
+        if hasattr(obj, 'is_enrolled'):
+            return obj.is_enrolled
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.students.filter(pk=request.user.pk).exists()
         return False
 
 
-class CourseListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for course listing."""
+class CourseListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    """Lightweight serializer for course listing.
+
+    Expects a queryset built with `Course.objects.with_enrollment(user)`.
+    """
     instructor_name = serializers.CharField(source='instructor.username', read_only=True)
-    student_count = serializers.IntegerField(source='students.count', read_only=True)
-    lesson_count = serializers.IntegerField(source='lessons.count', read_only=True)
-    assignment_count = serializers.IntegerField(source='assignments.count', read_only=True)
-    is_enrolled = serializers.SerializerMethodField()
+    is_enrolled = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Course
         fields = ['id', 'title', 'description', 'instructor', 'instructor_name',
                   'student_count', 'lesson_count', 'assignment_count',
-                  'is_enrolled', 'is_published', 'created_at']
-
-    def get_is_enrolled(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.students.filter(pk=request.user.pk).exists()
-        return False
+                  'is_enrolled', 'is_published', 'created_at', 'updated_at']
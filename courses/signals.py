@@ -0,0 +1,158 @@
+"""
+Keep derived data in step with Course, Lesson and Assignment writes: the
+denormalized counters on Course, the full-text search index, the version
+stamps behind the cached catalog reads (courses/caching.py) and the
+tombstones that delta sync reports deletions (and unenrollments) from
+(courses/sync.py).
+
+Every counter change is a single `UPDATE ... SET x = x + n` so concurrent
+writers never lose increments. Bulk operations that bypass signals
+(bulk_create, queryset.delete, raw SQL) must adjust the counters themselves
+or be followed by `Course.objects.recount()` /
+`manage.py reconcile_course_counters`, and by
+`manage.py rebuild_search_index`, and must call `caching.touch_courses()`.
+"""
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Course, Lesson, Assignment, Tombstone
+from . import caching, search
+from .sync import bury_enrollments
+
+
+def bump(course_ids, field, delta):
+    if course_ids:
+        Course.objects.filter(pk__in=course_ids).adjust_counter(field, delta)
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump([instance.course_id], 'lesson_count', 1)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    bump([instance.course_id], 'lesson_count', -1)
+
+
+@receiver(post_save, sender=Assignment)
+def assignment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump([instance.course_id], 'assignment_count', 1)
+
+
+@receiver(post_delete, sender=Assignment)
+def assignment_deleted(sender, instance, **kwargs):
+    bump([instance.course_id], 'assignment_count', -1)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Track `Course.students` from either side of the relation.
+
+    Django only reports ids it actually inserted for `post_add`, but passes
+    the requested ids for removals, so the rows that really exist are
+    captured in the `pre_*` phase and applied in the matching `post_*`.
+    """
+    through = sender.objects
+    if action == 'post_add':
+        if reverse:
+            bump(pk_set, 'student_count', 1)
+            enrollment_changed(pk_set, [instance.pk])
+        else:
+            bump([instance.pk], 'student_count', len(pk_set))
+            enrollment_changed([instance.pk], pk_set)
+    elif action in ('pre_remove', 'pre_clear'):
+        if reverse:
+            rows = through.filter(user_id=instance.pk)
+            if action == 'pre_remove':
+                rows = rows.filter(course_id__in=pk_set)
+            instance._student_count_delta = {'courses': list(rows.values_list('course_id', flat=True))}
+        else:
+            rows = through.filter(course_id=instance.pk)
+            if action == 'pre_remove':
+                rows = rows.filter(user_id__in=pk_set)
+            instance._student_count_delta = {'users': list(rows.values_list('user_id', flat=True))}
+    elif action in ('post_remove', 'post_clear'):
+        delta = getattr(instance, '_student_count_delta', None) or {}
+        instance._student_count_delta = None
+        if delta.get('courses'):
+            bump(delta['courses'], 'student_count', -1)
+            enrollment_changed(delta['courses'], [instance.pk])
+            bury_enrollments((course_id, instance.pk) for course_id in delta['courses'])
+        elif delta.get('users'):
+            bump([instance.pk], 'student_count', -len(delta['users']))
+            enrollment_changed([instance.pk], delta['users'])
+            bury_enrollments((instance.pk, user_id) for user_id in delta['users'])
+
+
+def enrollment_changed(course_ids, user_ids):
+    if course_ids and user_ids:
+        caching.touch_courses(course_ids)
+        caching.touch_enrollments(user_ids)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Assignment)
+def reindex(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_object(instance)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Assignment)
+def unindex(sender, instance, **kwargs):
+    search.remove_object(instance)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.touch_courses([instance.pk])
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def child_changed(sender, instance, signal, created=False, raw=False, **kwargs):
+    # Catalog entries only show the counts, which move on create and delete.
+    if not raw:
+        caching.touch_courses([instance.course_id],
+                              catalog=created or signal is post_delete,
+                              lessons=sender is Lesson)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def instructor_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Course payloads embed the instructor's username.
+    if raw or instance.role != 'instructor' or update_fields == frozenset({'last_login'}):
+        return
+    caching.touch_courses(list(Course.objects.filter(instructor=instance)
+                               .values_list('pk', flat=True)))
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Assignment)
+def bury(sender, instance, **kwargs):
+    course_id = instance.pk if sender is Course else instance.course_id
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk,
+                             course_id=course_id)
+
+
+@receiver(pre_delete, sender=Assignment)
+def bury_submissions(sender, instance, **kwargs):
+    # Submissions have no delete receivers of their own, so cascades can keep
+    # deleting them in bulk; record them here while they still exist.
+    Tombstone.objects.bulk_create(
+        [Tombstone(kind='submission', object_id=pk, course_id=instance.course_id,
+                   student_id=student_id)
+         for pk, student_id in instance.submissions.values_list('pk', 'student_id')],
+        batch_size=500)
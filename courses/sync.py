@@ -0,0 +1,114 @@
+"""
+Delta sync for list endpoints.
+
+`GET <list>?since=<ISO 8601 timestamp>` returns only the rows whose
+`updated_at` is later than the watermark, oldest change first, paginated as
+usual. The response adds:
+
+- `watermark`: the `since` value to send on the next poll. Take it from the
+  last page. It trails the server clock by SYNC_MARGIN so rows written by
+  transactions still in flight are not skipped; clients may see a row twice
+  and should upsert by id.
+- `deleted` (first page only): ids removed since the watermark, from the
+  tombstone table, plus any rows that dropped out of the list for other
+  reasons a view knows about (an unpublished course, say, or the
+  assignments of a course the student has left).
+
+A watermark older than TOMBSTONE_RETENTION gets 410 Gone: deletions that
+old may already be pruned, so the client has to start over without `since`.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Course, Tombstone
+
+SYNC_MARGIN = timedelta(seconds=5)
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+def parse_since(value):
+    since = parse_datetime(value.replace(' ', '+'))
+    if since is None:
+        raise ValidationError({'since': 'Expected an ISO 8601 timestamp.'})
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def course_gone():
+    """Tombstone condition: the tombstone's course no longer exists."""
+    return ~Exists(Course.objects.filter(pk=OuterRef('course_id')))
+
+
+class DeltaSyncMixin:
+    """
+    Add `?since=` to a list view. Subclasses set `tombstone_kind` and may
+    narrow `visible_tombstones()` / extend `removed_ids()`.
+    """
+    tombstone_kind = None
+
+    def get_since(self):
+        if not hasattr(self, '_since'):
+            value = self.request.query_params.get('since')
+            self._since = parse_since(value) if value else None
+        return self._since
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        since = self.get_since()
+        return queryset.filter(updated_at__gt=since) if since else queryset
+
+    def visible_tombstones(self, tombstones):
+        return tombstones
+
+    def removed_ids(self, since):
+        tombstones = Tombstone.objects.filter(kind=self.tombstone_kind, deleted_at__gt=since)
+        return list(self.visible_tombstones(tombstones)
+                    .order_by('object_id').values_list('object_id', flat=True).distinct())
+
+    def list(self, request, *args, **kwargs):
+        since = self.get_since()
+        if since is None:
+            return super().list(request, *args, **kwargs)
+        started = timezone.now()
+        if since < started - TOMBSTONE_RETENTION:
+            return Response({'detail': 'Watermark too old; resync without `since`.'},
+                            status=status.HTTP_410_GONE)
+        # Changes in the order they happened, so paging never skips a row
+        # that is written while the client is still paging.
+        self.paginator.ordering = ('updated_at', 'id')
+        response = super().list(request, *args, **kwargs)
+        if self.paginator.cursor_query_param not in request.query_params:
+            response.data['deleted'] = self.removed_ids(since)
+        response.data['watermark'] = max(since, started - SYNC_MARGIN).isoformat()
+        return response
+
+
+def bury_enrollments(pairs):
+    """Record that the students left the courses in `(course_id, user_id)` pairs."""
+    Tombstone.objects.bulk_create(
+        [Tombstone(kind='enrollment', object_id=course_id, course_id=course_id,
+                   student_id=user_id) for course_id, user_id in pairs],
+        batch_size=500)
+
+
+def left_courses(user, since):
+    """Ids of the courses `user` left after `since` and is not enrolled in again."""
+    enrolled = Course.students.through.objects.filter(user_id=user.pk).values('course_id')
+    return (Tombstone.objects.filter(kind='enrollment', student_id=user.pk, deleted_at__gt=since)
+            .exclude(course_id__in=enrolled).values('course_id'))
+
+
+def taught_or_enrolled(user):
+    """Tombstone scope for the courses `user` teaches or studies in (or that are gone)."""
+    if user.role == 'instructor':
+        courses = Course.objects.filter(instructor_id=user.pk).values('pk')
+    else:
+        courses = Course.students.through.objects.filter(user_id=user.pk).values('course_id')
+    return Q(course_id__in=courses) | Q(course_gone())
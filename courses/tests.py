@@ -0,0 +1,1071 @@
+"""
+Query-count tests for the course API.
+
+Each test loads a page, adds rows, and loads it again: the second load must
+issue exactly as many queries as the first, so a lookup made per row (an
+N+1) fails however few rows the fixtures hold.
+"""
+import asyncio
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import add_claims
+from accounts.models import User
+from . import bodies, events, export
+from .deadlines import process_deadlines
+from .management.commands.benchmark_concurrency import READ_ROUTES
+from .management.commands.benchmark_endpoints import Command as EndpointBenchmark
+from .management.commands.check_query_plans import (
+    Command as QueryPlanCheck, MERGED_LISTS, problems)
+from .models import Assignment, Course, Lesson, Submission
+
+
+class QueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='x', role='instructor')
+        cls.students = [User.objects.create_user(f'student{i}', password='x', role='student')
+                        for i in range(3)]
+
+    def setUp(self):
+        # Stamps and the copies of them outlive each test's rollback.
+        for alias in ('default', 'responses', 'local', 'shared'):
+            caches[alias].clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def count_queries(self, client, url):
+        # Cached responses would hide the queries under test.
+        for alias in ('default', 'responses', 'local', 'shared'):
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, client, url, add_rows):
+        """Same query count for `url` before and after `add_rows()`."""
+        before = self.count_queries(client, url)
+        add_rows()
+        after = self.count_queries(client, url)
+        self.assertEqual(before, after, f'{url}: {before} queries, then {after} with more rows')
+
+    def make_courses(self, n, **kwargs):
+        courses = []
+        for i in range(n):
+            course = Course.objects.create(title=f'Course {i}', description='About it',
+                                           instructor=self.instructor, **kwargs)
+            course.students.add(*self.students)
+            courses.append(course)
+        return courses
+
+
+class CourseListQueryTests(QueryCountTestCase):
+    def test_course_list_queries_do_not_grow_with_courses(self):
+        url = reverse('course-list')
+        self.make_courses(2)
+        for user in (self.students[0], self.instructor):
+            with self.subTest(user=user.username):
+                self.assertConstantQueries(self.client_for(user), url,
+                                           lambda: self.make_courses(8))
+
+    def test_course_list_counts_and_enrollment(self):
+        enrolled, other = self.make_courses(2)
+        other.students.remove(self.students[0])
+        Lesson.objects.create(course=enrolled, title='L', content='x', order=1)
+        Assignment.objects.create(course=enrolled, title='A', description='y',
+                                  due_date=timezone.now() + timedelta(days=1))
+        caches['responses'].clear()
+        response = self.client_for(self.students[0]).get(reverse('course-list'))
+        rows = {row['id']: row for row in response.data['results']}
+        self.assertTrue(rows[enrolled.pk]['is_enrolled'])
+        self.assertFalse(rows[other.pk]['is_enrolled'])
+        self.assertEqual((rows[enrolled.pk]['student_count'], rows[enrolled.pk]['lesson_count'],
+                          rows[enrolled.pk]['assignment_count']), (3, 1, 1))
+
+    def test_cached_course_list_costs_no_queries(self):
+        self.make_courses(2)
+        client = self.client_for(self.students[0])
+        with CaptureQueriesContext(connection) as cold:
+            client.get(reverse('course-list'))
+        # Stamps are started with an INSERT each, and nothing counts the cache table.
+        self.assertFalse([q for q in cold.captured_queries if 'COUNT(*)' in q['sql']
+                          and 'lms_shared_cache' in q['sql']])
+        with self.assertNumQueries(0):
+            response = client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, 200)
+
+
+class LessonQueryTests(QueryCountTestCase):
+    def setUp(self):
+        self.course, = self.make_courses(1)
+
+    def add_lessons(self, n):
+        start = self.course.lessons.count()
+        Lesson.objects.bulk_create([
+            Lesson(course=self.course, title=f'Lesson {i}', content='Text ' * 100, order=i)
+            for i in range(start, start + n)
+        ])
+        Assignment.objects.bulk_create([
+            Assignment(course=self.course, title=f'Assignment {i}', description='Do it',
+                       due_date=timezone.now() + timedelta(days=i))
+            for i in range(start, start + n)
+        ])
+
+    def test_course_detail_queries_do_not_grow_with_lessons(self):
+        url = reverse('course-detail', args=[self.course.pk])
+        self.add_lessons(2)
+        self.assertConstantQueries(self.client_for(self.students[0]), url,
+                                   lambda: self.add_lessons(20))
+        response = self.client_for(self.students[0]).get(url)
+        self.assertEqual(len(response.data['lessons']), 22)
+        self.assertEqual(len(response.data['assignments']), 22)
+
+    def test_lesson_list_queries_do_not_grow_with_lessons(self):
+        url = reverse('lesson-list', args=[self.course.pk])
+        self.add_lessons(2)
+        self.assertConstantQueries(self.client_for(self.students[0]), url,
+                                   lambda: self.add_lessons(15))
+
+    def test_lesson_detail_queries(self):
+        self.add_lessons(1)
+        lesson = self.course.lessons.get()
+        url = reverse('lesson-detail', args=[self.course.pk, lesson.pk])
+        self.assertConstantQueries(self.client_for(self.students[0]), url,
+                                   lambda: self.add_lessons(10))
+
+
+class SubmissionQueryTests(QueryCountTestCase):
+    def setUp(self):
+        self.course, = self.make_courses(1)
+
+    def add_submissions(self, n):
+        """`n` new assignments, each submitted by every student."""
+        for i in range(n):
+            assignment = Assignment.objects.create(
+                course=self.course, title=f'Assignment {i}', description='Do it',
+                due_date=timezone.now() + timedelta(days=1))
+            Submission.objects.bulk_create([
+                Submission(assignment=assignment, student=student, content='Answer')
+                for student in self.students
+            ])
+
+    def test_submission_list_queries_do_not_grow_with_submissions(self):
+        url = reverse('submission-list')
+        self.add_submissions(1)
+        for user in (self.students[0], self.instructor):
+            with self.subTest(user=user.username):
+                self.assertConstantQueries(self.client_for(user), url,
+                                           lambda: self.add_submissions(6))
+
+    def test_submission_detail_queries(self):
+        self.add_submissions(1)
+        submission = Submission.objects.filter(student=self.students[0]).get()
+        url = reverse('submission-detail', args=[submission.pk])
+        for user in (self.students[0], self.instructor):
+            with self.subTest(user=user.username):
+                self.assertConstantQueries(self.client_for(user), url,
+                                           lambda: self.add_submissions(3))
+
+
+class QueryPlanTests(QueryCountTestCase):
+    """
+    `check_query_plans` on fixtures: every statement behind the list and
+    detail reads (first page and the next) must seek through an index, and
+    a page may issue at most STATEMENT_LIMIT of them.
+    """
+    # Per page; fewer than the rows on one, so loading anything per row fails.
+    STATEMENT_LIMIT = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Just over a page of everything, so each list has a next page.
+        courses = [Course.objects.create(title=f'Course {i}', description='About it',
+                                         instructor=cls.instructor, is_published=True)
+                   for i in range(22)]
+        course = courses[0]
+        course.students.add(*cls.students)
+        Lesson.objects.bulk_create([
+            Lesson(course=course, title=f'Lesson {i}', content='Text', order=i)
+            for i in range(22)
+        ])
+        assignments = Assignment.objects.bulk_create([
+            Assignment(course=course, title=f'Assignment {i}', description='Do it',
+                       due_date=timezone.now() + timedelta(days=i))
+            for i in range(22)
+        ])
+        Submission.objects.bulk_create([
+            Submission(assignment=assignment, student=student, content='Answer')
+            for assignment in assignments for student in cls.students
+        ])
+        cls.objects = {
+            'course': course,
+            'lesson': course.lessons.order_by('pk').first(),
+            'assignment': assignments[0],
+            'submission': Submission.objects.order_by('pk').first(),
+            'users': {'student': cls.students[0], 'instructor': cls.instructor},
+            'roster': [student.username for student in cls.students],
+            'word': 'Course',
+        }
+
+    def test_read_plans_use_indexes(self):
+        bench, check = EndpointBenchmark(), QueryPlanCheck()
+        scenarios = [s for s in bench.scenarios(self.objects)
+                     if s['method'] == 'get' and s['route'] in READ_ROUTES]
+        for scenario in scenarios:
+            with self.subTest(scenario['label']):
+                statements = check.capture(bench, scenario, self.objects)
+                self.assertTrue(statements)
+                # Two pages for the lists, one for the detail reads.
+                self.assertLessEqual(len(statements), 2 * self.STATEMENT_LIMIT,
+                                     f'{len(statements)} statements')
+                sort_allowed = scenario['label'] in MERGED_LISTS
+                for sql in statements:
+                    found = problems(check.explain(sql), sql, sort_allowed=sort_allowed)
+                    self.assertEqual(found, [], sql)
+
+    def test_index_walks_without_a_limit_are_flagged(self):
+        check = QueryPlanCheck()
+        # As DatabaseCache's cull count: the whole table, read through an index.
+        count = 'SELECT COUNT(*) FROM "lms_shared_cache"'
+        self.assertTrue(problems(check.explain(count), count))
+        page = ('SELECT "id" FROM "courses_submission" '
+                'ORDER BY "updated_at" DESC LIMIT 20')
+        self.assertEqual(problems(check.explain(page), page), [])
+
+
+@override_settings(BODY_STORE_MIN_LENGTH=500)
+class BodyStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='x', role='instructor')
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=instructor)
+
+    def setUp(self):
+        self.text = 'A long lesson. ' * 100
+        self.lesson = Lesson.objects.create(course=self.course, title='L', content=self.text)
+
+    def column(self, lesson):
+        return Lesson.objects.filter(pk=lesson.pk).values_list('content', 'content_body').get()
+
+    def test_long_text_is_stored_and_read_back_whole(self):
+        content, digest = self.column(self.lesson)
+        self.assertEqual(content, self.text[:bodies.PREVIEW_LENGTH])
+        self.assertEqual(digest, bodies.digest_of(self.text))
+        self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).content, self.text)
+        self.assertEqual(Lesson.objects.defer('content').get(pk=self.lesson.pk).content, self.text)
+
+    def test_text_derived_from_content_is_saved_whole(self):
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.content = lesson.content.replace('long', 'longer')
+        lesson.save()
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).content,
+                         self.text.replace('long', 'longer'))
+
+    def test_saving_unchanged_rows_keeps_the_body(self):
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.title = 'Renamed'
+        lesson.save()
+        lesson.refresh_from_db()
+        lesson.save()
+        self.assertEqual(self.column(lesson), self.column(self.lesson))
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).content, self.text)
+
+    def test_update_stores_text_like_save(self):
+        lessons = Lesson.objects.filter(pk=self.lesson.pk)
+        lessons.update(content='Short now')
+        self.assertEqual(self.column(self.lesson), ('Short now', None))
+        lessons.update(content=self.text * 2)
+        self.assertEqual(lessons.get().content, self.text * 2)
+        lessons.update(content=Concat(Value('Edited: '), 'title'))
+        self.assertEqual(self.column(self.lesson), ('Edited: L', None))
+
+    def test_saving_only_content_stores_the_body_too(self):
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.content = 'Short now'
+        lesson.save(update_fields=['content'])
+        self.assertEqual(self.column(lesson), ('Short now', None))
+
+    def test_bulk_create_stores_bodies_in_one_query(self):
+        lessons = [Lesson(course=self.course, title=f'L{i}', content=f'{i} {self.text}')
+                   for i in range(3)]
+        with self.assertNumQueries(2):
+            Lesson.objects.bulk_create(lessons)
+        for i, lesson in enumerate(lessons):
+            self.assertEqual(self.column(lesson)[1], bodies.digest_of(f'{i} {self.text}'))
+            self.assertEqual(Lesson.objects.get(pk=lesson.pk).content, f'{i} {self.text}')
+
+    def test_deferred_text_is_read_in_one_query(self):
+        lesson = Lesson.objects.defer('content').get(pk=self.lesson.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(lesson.content, self.text)
+
+
+class AdminQueryTests(TestCase):
+    """Each course admin page issues as many queries at 10N rows as at N."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x', role='admin')
+        cls.instructor = User.objects.create_user('instructor', password='x', role='instructor')
+        cls.students = [User.objects.create_user(f'student{i}', password='x', role='student')
+                        for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.added = 0
+
+    def add_courses(self, n):
+        """`n` courses, each with a lesson, an assignment and its submissions."""
+        for i in range(self.added, self.added + n):
+            course = Course.objects.create(title=f'Course {i}', description='About it',
+                                           instructor=self.instructor, is_published=True)
+            course.students.add(*self.students)
+            Lesson.objects.create(course=course, title=f'Lesson {i}', content='Text')
+            assignment = Assignment.objects.create(
+                course=course, title=f'Assignment {i}', description='Do it',
+                due_date=timezone.now() + timedelta(days=1))
+            Submission.objects.bulk_create([
+                Submission(assignment=assignment, student=student, content='Answer',
+                           status='graded', score=1)
+                for student in self.students
+            ])
+        self.added += n
+
+    def pages(self):
+        course = Course.objects.order_by('pk').first()
+
+        def changelist(model, **params):
+            url = reverse(f'admin:courses_{model}_changelist')
+            return f'{url}?{urlencode(params)}' if params else url
+
+        def change(obj):
+            return reverse(f'admin:courses_{obj._meta.model_name}_change', args=[obj.pk])
+
+        def autocomplete(model, field, term=''):
+            return reverse('admin:autocomplete') + '?' + urlencode(
+                {'app_label': 'courses', 'model_name': model, 'field_name': field, 'term': term})
+
+        return {
+            'course-changelist': changelist('course'),
+            'course-changelist-filtered': changelist(
+                'course', instructor=self.instructor.username, is_published__exact=1),
+            'course-change': change(course),
+            'lesson-changelist': changelist('lesson'),
+            'lesson-changelist-course': changelist('lesson', course__id__exact=course.pk),
+            'lesson-change': change(course.lessons.get()),
+            'assignment-changelist': changelist('assignment'),
+            'assignment-change': change(course.assignments.get()),
+            'submission-changelist': changelist('submission'),
+            'submission-changelist-filtered': changelist(
+                'submission', status__exact='graded', course='Course'),
+            'submission-change': change(Submission.objects.order_by('pk').first()),
+            'autocomplete-instructor': autocomplete('course', 'instructor'),
+            'autocomplete-students': autocomplete('course', 'students', 'stu'),
+            'autocomplete-assignment': autocomplete('submission', 'assignment'),
+        }
+
+    def count_queries(self):
+        counts = {}
+        for label, url in self.pages().items():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, label)
+            counts[label] = len(ctx.captured_queries)
+        return counts
+
+    def test_admin_queries_do_not_grow_with_rows(self):
+        self.add_courses(3)
+        # Once for the per-process lookups (content types) the pages share.
+        self.count_queries()
+        before = self.count_queries()
+        self.add_courses(27)
+        after = self.count_queries()
+        for label in before:
+            with self.subTest(label):
+                self.assertEqual(before[label], after[label])
+
+    def test_course_page_links_to_its_lessons_and_assignments(self):
+        self.add_courses(1)
+        course = Course.objects.get()
+        response = self.client.get(reverse('admin:courses_course_change', args=[course.pk]))
+        lessons = reverse('admin:courses_lesson_changelist')
+        self.assertContains(response, f'{lessons}?course__id__exact={course.pk}')
+        self.assertContains(response, f"{reverse('admin:courses_assignment_add')}?course={course.pk}")
+
+
+class AnalyticsTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+        cls.course.students.add(*cls.students)
+        cls.due = timezone.now() - timedelta(days=1)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='A', description='y',
+                                                   due_date=cls.due, max_score=100)
+        on_time, late = [Submission.objects.create(assignment=cls.assignment, student=student,
+                                                   content='Answer')
+                         for student in cls.students[:2]]
+        Submission.objects.filter(pk=on_time.pk).update(
+            submitted_at=cls.due - timedelta(hours=2), status='graded', score=80)
+        Submission.objects.filter(pk=late.pk).update(submitted_at=cls.due + timedelta(hours=4))
+
+    def url(self, **params):
+        url = reverse('course-analytics', kwargs={'pk': self.course.pk})
+        return f'{url}?{urlencode(params)}' if params else url
+
+    def refresh(self, *args):
+        call_command('refresh_analytics', *args, stdout=StringIO())
+
+    def test_only_the_course_instructor_can_view_analytics(self):
+        other = User.objects.create_user('other', password='x', role='instructor')
+        for user, status in ((self.instructor, 200), (other, 403), (self.students[0], 403)):
+            with self.subTest(user=user.username):
+                self.assertEqual(self.client_for(user).get(self.url()).status_code, status)
+
+    def test_days_is_validated_and_clamped(self):
+        client = self.client_for(self.instructor)
+        self.assertEqual(client.get(self.url(days='soon')).status_code, 400)
+        for days in (0, -5, 100000000):
+            with self.subTest(days=days):
+                self.assertEqual(client.get(self.url(days=days)).status_code, 200)
+
+    def test_refresh_rolls_submissions_and_enrollment_up(self):
+        self.refresh()
+        data = self.client_for(self.instructor).get(self.url()).data
+        self.assertEqual(data['enrollment'][-1]['student_count'], 3)
+        row, = data['assignments']
+        self.assertEqual((row['submitted'], row['graded'], row['late'], row['mean']),
+                         (2, 1, 1, 80.0))
+        self.assertEqual(row['average_hours_after_due'], 1.0)
+        self.assertEqual(sum(day['submitted'] for day in data['submissions_per_day']), 2)
+        self.assertEqual(sum(data['grade_distribution']), 1)
+
+        # An incremental run picks up what changed since the last one.
+        Submission.objects.create(assignment=self.assignment, student=self.students[2],
+                                  content='Answer')
+        self.refresh()
+        row, = self.client_for(self.instructor).get(self.url()).data['assignments']
+        self.assertEqual((row['submitted'], row['late']), (3, 2))
+
+    def test_analytics_queries_do_not_grow_with_assignments(self):
+        def add_rows():
+            for i in range(5):
+                assignment = Assignment.objects.create(course=self.course, title=f'A{i}',
+                                                       description='y', due_date=self.due)
+                Submission.objects.create(assignment=assignment, student=self.students[0],
+                                          content='Answer')
+            self.refresh('--full')
+
+        self.refresh()
+        self.assertConstantQueries(self.client_for(self.instructor), self.url(), add_rows)
+
+
+class SubmissionExportTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+
+    def add_submissions(self, n):
+        assignment = Assignment.objects.create(course=self.course, title='Essay', description='y',
+                                               due_date=timezone.now() + timedelta(days=1))
+        for student in self.students[:n]:
+            Submission.objects.create(assignment=assignment, student=student,
+                                      content=f'Answer by {student.username}')
+
+    def url(self, fmt):
+        url = reverse('course-submission-export', kwargs={'pk': self.course.pk})
+        return f'{url}?format={fmt}'
+
+    def export(self, client, fmt):
+        """The response and its streamed text, with the queries both took."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(self.url(fmt))
+            text = b''.join(response.streaming_content).decode() if response.streaming else None
+        return response, text, len(ctx.captured_queries)
+
+    def test_csv_and_ndjson(self):
+        self.add_submissions(2)
+        client = self.client_for(self.instructor)
+        response, text, _ = self.export(client, 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        header, *rows = csv.reader(StringIO(text))
+        self.assertEqual(header, export.EXPORT_FIELDS)
+        self.assertEqual(sorted(row[header.index('content')] for row in rows),
+                         ['Answer by student0', 'Answer by student1'])
+
+        response, text, _ = self.export(client, 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(sorted(row['student_username'] for row in rows),
+                         ['student0', 'student1'])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client_for(self.instructor).get(self.url('xml'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.json())
+
+    def test_only_the_course_instructor_can_export(self):
+        other = User.objects.create_user('other', password='x', role='instructor')
+        for user in (other, self.students[0]):
+            with self.subTest(user=user.username):
+                self.assertEqual(self.client_for(user).get(self.url('csv')).status_code, 403)
+
+    def test_export_queries_do_not_grow_with_rows(self):
+        client = self.client_for(self.instructor)
+        self.add_submissions(1)
+        *_, before = self.export(client, 'csv')
+        self.add_submissions(3)
+        response, text, after = self.export(client, 'csv')
+        self.assertEqual(len(text.splitlines()), 5)
+        self.assertEqual(before, after)
+
+    async def test_asgi_export_streams_from_an_async_iterator(self):
+        await sync_to_async(self.add_submissions)(3)
+        token = AccessToken.for_user(self.instructor)
+        response = await self.async_client.get(self.url('ndjson'),
+                                               headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        text = b''.join([part async for part in response.streaming_content]).decode()
+        self.assertEqual(len(text.splitlines()), 3)
+
+
+class GradebookTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+        cls.course.students.add(*cls.students)
+        due = timezone.now() + timedelta(days=1)
+        cls.graded, cls.empty = [
+            Assignment.objects.create(course=cls.course, title=title, description='y',
+                                      due_date=due, max_score=10)
+            for title in ('Graded', 'Empty')]
+        for student, score in zip(cls.students, (4, 8, None)):
+            Submission.objects.create(assignment=cls.graded, student=student, content='Answer',
+                                      score=score, status='submitted' if score is None else 'graded')
+
+    def url(self):
+        return reverse('course-gradebook', kwargs={'pk': self.course.pk})
+
+    def test_matrix_and_statistics(self):
+        data = self.client_for(self.instructor).get(self.url()).data
+        graded, empty = data['assignments']
+        self.assertEqual(graded['id'], self.graded.pk)
+        self.assertEqual(
+            {key: graded[key] for key in ('submitted', 'graded', 'submission_rate', 'mean',
+                                          'median', 'max')},
+            {'submitted': 3, 'graded': 2, 'submission_rate': 1.0, 'mean': 6.0, 'median': 6.0,
+             'max': 8})
+        self.assertEqual(graded['histogram'], [0, 0, 0, 0, 1, 0, 0, 0, 1, 0])
+        self.assertEqual((empty['submitted'], empty['mean'], empty['median']), (0, None, None))
+        self.assertEqual([row['username'] for row in data['results']],
+                         ['student0', 'student1', 'student2'])
+        self.assertEqual(data['results'][0]['grades'], [{'score': 4, 'status': 'graded'}, None])
+        self.assertEqual(data['results'][2]['grades'][0], {'score': None, 'status': 'submitted'})
+
+    def test_unenrolled_students_are_left_out(self):
+        self.course.students.remove(self.students[1])
+        data = self.client_for(self.instructor).get(self.url()).data
+        graded = data['assignments'][0]
+        self.assertEqual((graded['submitted'], graded['mean'], graded['max']), (2, 4.0, 4))
+        self.assertEqual(len(data['results']), 2)
+
+    def test_only_the_course_instructor_can_view_the_gradebook(self):
+        other = User.objects.create_user('other', password='x', role='instructor')
+        for user in (other, self.students[0]):
+            with self.subTest(user=user.username):
+                self.assertEqual(self.client_for(user).get(self.url()).status_code, 403)
+
+    def test_gradebook_queries_do_not_grow_with_students_or_assignments(self):
+        def add_rows():
+            students = [User.objects.create_user(f'late{i}', password='x', role='student')
+                        for i in range(5)]
+            self.course.students.add(*students)
+            for i in range(4):
+                assignment = Assignment.objects.create(
+                    course=self.course, title=f'More {i}', description='y',
+                    due_date=timezone.now(), max_score=10)
+                for student in students:
+                    Submission.objects.create(assignment=assignment, student=student,
+                                              content='Answer', score=i, status='graded')
+
+        self.assertConstantQueries(self.client_for(self.instructor), self.url(), add_rows)
+
+
+class BulkGradeTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+        cls.assignment = Assignment.objects.create(
+            course=cls.course, title='Essay', description='y', max_score=10,
+            due_date=timezone.now() + timedelta(days=1))
+
+    def add_submissions(self, n):
+        students = [User.objects.create_user(f'writer{User.objects.count()}', role='student')
+                    for _ in range(n)]
+        return [Submission.objects.create(assignment=self.assignment, student=student,
+                                          content='Essay') for student in students]
+
+    def grade(self, items, user=None):
+        return self.client_for(user or self.instructor).patch(
+            reverse('submission-bulk-grade'), items, format='json')
+
+    def test_valid_items_are_graded_and_every_item_reported_in_order(self):
+        first, second, too_high = self.add_submissions(3)
+        other = User.objects.create_user('other', password='x', role='instructor')
+        foreign = Submission.objects.create(
+            assignment=Assignment.objects.create(
+                course=Course.objects.create(title='Other', description='x', instructor=other),
+                title='Theirs', description='y', due_date=timezone.now()),
+            student=self.students[0], content='Essay')
+        response = self.grade([
+            {'id': first.pk, 'score': 7, 'feedback': 'Good'},
+            {'id': second.pk, 'score': 'ten'},
+            {'id': first.pk, 'score': 9},
+            {'id': too_high.pk, 'score': 11},
+            {'id': foreign.pk, 'score': 5},
+            {'id': second.pk, 'score': 3},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([(r['id'], r['status']) for r in response.data['results']], [
+            (first.pk, 'updated'), (second.pk, 'error'), (first.pk, 'error'),
+            (too_high.pk, 'error'), (foreign.pk, 'error'), (second.pk, 'updated')])
+        self.assertEqual(Submission.objects.filter(status='graded').count(), 2)
+        first.refresh_from_db()
+        self.assertEqual((first.score, first.feedback, first.status), (7, 'Good', 'graded'))
+        foreign.refresh_from_db()
+        self.assertIsNone(foreign.score)
+
+    def test_request_must_be_a_bounded_list(self):
+        self.assertEqual(self.grade({'id': 1, 'score': 1}).status_code, 400)
+        items = [{'id': i, 'score': 1} for i in range(1001)]
+        self.assertEqual(self.grade(items).status_code, 400)
+
+    def test_students_cannot_grade(self):
+        submission, = self.add_submissions(1)
+        response = self.grade([{'id': submission.pk, 'score': 5}], user=self.students[0])
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_grade_queries_do_not_grow_with_items(self):
+        def queries(n):
+            items = [{'id': sub.pk, 'score': 5} for sub in self.add_submissions(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.grade(items)
+            self.assertEqual(response.data['updated'], n)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(2), queries(20))
+
+
+class RosterTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+
+    def url(self, **params):
+        url = reverse('course-roster', kwargs={'pk': self.course.pk})
+        return f'{url}?{urlencode(params)}' if params else url
+
+    def post(self, data, url=None, **kwargs):
+        kwargs.setdefault('format', 'json')
+        return self.client_for(self.instructor).post(url or self.url(), data, **kwargs)
+
+    def enrolled(self):
+        return set(self.course.students.values_list('username', flat=True))
+
+    def test_json_list_of_usernames_and_ids(self):
+        self.course.students.add(self.students[2])
+        response = self.post(['student0', str(self.students[1].pk), 'student2', 'nobody',
+                              'instructor'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'added': 2, 'already_enrolled': 1, 'removed': 0,
+                                         'not_found': ['nobody', 'instructor'],
+                                         'student_count': 3})
+        self.assertEqual(self.enrolled(), {'student0', 'student1', 'student2'})
+
+    def test_csv_body_and_upload(self):
+        response = self.post('username\nstudent0\n', format=None, content_type='text/csv')
+        self.assertEqual(response.data['added'], 1)
+        upload = SimpleUploadedFile('roster.csv', b'\xef\xbb\xbfstudent1,Ann\nstudent2,Bo\n')
+        response = self.post({'file': upload}, format='multipart')
+        self.assertEqual(response.data['added'], 2)
+        self.assertEqual(self.enrolled(), {'student0', 'student1', 'student2'})
+
+    def test_replace_removes_students_missing_from_the_list(self):
+        self.course.students.add(*self.students)
+        response = self.post({'students': ['student0'], 'replace': True})
+        self.assertEqual((response.data['removed'], response.data['student_count']), (2, 1))
+        self.assertEqual(self.enrolled(), {'student0'})
+        self.post(['student1'], url=self.url(replace=1))
+        self.assertEqual(self.enrolled(), {'student1'})
+
+    def test_bad_payload_and_other_instructors_are_rejected(self):
+        self.assertEqual(self.post({'name': 'student0'}).status_code, 400)
+        other = User.objects.create_user('other', password='x', role='instructor')
+        response = self.client_for(other).post(self.url(), ['student0'], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.enrolled(), set())
+
+    def test_roster_queries_do_not_grow_with_entries(self):
+        def queries(n, prefix):
+            names = [User.objects.create_user(f'{prefix}{i}', role='student').username
+                     for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.post(names + ['nobody'])
+            self.assertEqual(response.data['added'], n)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(2, 'few'), queries(40, 'many'))
+
+
+class SearchTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Linear Algebra', description='Vectors and matrices',
+                                           instructor=cls.instructor, is_published=True)
+        cls.course.students.add(cls.students[0])
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Eigenvalues',
+                                           content='Eigenvalues of a matrix', order=1)
+        cls.assignment = Assignment.objects.create(
+            course=cls.course, title='Matrix homework', description='Invert the matrix',
+            due_date=timezone.now() + timedelta(days=1))
+        cls.draft = Course.objects.create(title='Draft matrices', description='Unpublished',
+                                          instructor=cls.instructor, is_published=False)
+
+    def search(self, q, user=None, **params):
+        url = f"{reverse('course-search')}?{urlencode({'q': q, **params})}"
+        return self.client_for(user or self.students[0]).get(url)
+
+    def hits(self, q, user=None):
+        response = self.search(q, user)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {(hit['type'], hit['id']) for hit in response.data['results']}
+
+    def test_words_and_prefixes_match_across_kinds(self):
+        self.assertEqual(self.hits('matri'), {('course', self.course.pk), ('lesson', self.lesson.pk),
+                                              ('assignment', self.assignment.pk)})
+        self.assertEqual(self.hits('eigenvalues matrix'), {('lesson', self.lesson.pk)})
+        hit, = self.search('eigenvalue').data['results']
+        self.assertIn('<mark>', hit['snippet'])
+
+    def test_visibility_follows_the_list_views(self):
+        self.assertNotIn(('course', self.draft.pk), self.hits('draft'))
+        self.assertIn(('course', self.draft.pk), self.hits('draft', self.instructor))
+        # Assignments only for enrolled students.
+        self.assertNotIn(('assignment', self.assignment.pk), self.hits('homework', self.students[1]))
+
+    def test_fts_syntax_in_the_query_is_searched_as_text(self):
+        for q in ('"', '"matrix', 'NEAR(matrix', 'matrix*', '*', 'matrix AND OR NOT',
+                  'title:matrix', '-matrix', '(matrix', "matrix'); DROP TABLE x; --"):
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q).status_code, 200)
+        self.assertIn(('lesson', self.lesson.pk), self.hits('"Eigenvalues"'))
+        self.assertIn(('lesson', self.lesson.pk), self.hits('(eigenvalues*'))
+        # Searched as the words "near eigenvalues", not as the NEAR() operator.
+        self.assertEqual(self.hits('NEAR(eigenvalues'), set())
+
+    def test_empty_query_and_bad_paging(self):
+        self.assertEqual(self.search('   ').data['results'], [])
+        self.assertEqual(self.search('matrix', limit='ten').status_code, 400)
+        self.assertEqual(len(self.search('matri', limit=1).data['results']), 1)
+
+    def test_search_queries_do_not_grow_with_hits(self):
+        url = f"{reverse('course-search')}?q=matrix"
+
+        def add_rows():
+            for i in range(10):
+                Lesson.objects.create(course=self.course, title=f'Matrix {i}', content='matrix',
+                                      order=i + 2)
+
+        self.assertConstantQueries(self.client_for(self.students[0]), url, add_rows)
+
+
+class DeltaSyncTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course, cls.other = [
+            Course.objects.create(title=title, description='About it', instructor=cls.instructor)
+            for title in ('Course', 'Other')]
+        for course in (cls.course, cls.other):
+            course.students.add(cls.students[0])
+        cls.assignment, cls.kept = [
+            Assignment.objects.create(course=course, title='A', description='y',
+                                      due_date=timezone.now() + timedelta(days=1))
+            for course in (cls.course, cls.other)]
+        cls.lesson = Lesson.objects.create(course=cls.course, title='L', content='x', order=1)
+
+    def poll(self, name, since, user=None, **kwargs):
+        url = f"{reverse(name, kwargs=kwargs)}?{urlencode({'since': since.isoformat()})}"
+        response = self.client_for(user or self.students[0]).get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_deleted_rows_are_reported(self):
+        since = timezone.now() - timedelta(seconds=1)
+        lesson_id, assignment_id = self.lesson.pk, self.assignment.pk
+        self.lesson.delete()
+        self.assignment.delete()
+        self.assertEqual(self.poll('lesson-list', since, course_id=self.course.pk)['deleted'],
+                         [lesson_id])
+        self.assertEqual(self.poll('assignment-list', since)['deleted'], [assignment_id])
+
+    def test_leaving_a_course_reports_its_assignments_as_deleted(self):
+        since = timezone.now() - timedelta(seconds=1)
+        self.students[0].enrolled_courses.remove(self.course)
+        data = self.poll('assignment-list', since)
+        self.assertEqual(data['deleted'], [self.assignment.pk])
+        self.assertNotIn(self.assignment.pk, [row['id'] for row in data['results']])
+        # Not to other students, nor after the watermark moved past it.
+        self.assertEqual(self.poll('assignment-list', since, self.students[1])['deleted'], [])
+        self.assertEqual(self.poll('assignment-list', timezone.now())['deleted'], [])
+
+    def test_removal_from_the_course_side_and_by_roster_is_reported(self):
+        since = timezone.now() - timedelta(seconds=1)
+        self.course.students.clear()
+        self.assertEqual(self.poll('assignment-list', since)['deleted'], [self.assignment.pk])
+        self.course.students.add(self.students[0])
+        # Enrolled again: nothing to delete.
+        self.assertEqual(self.poll('assignment-list', since)['deleted'], [])
+
+        self.client_for(self.instructor).post(
+            reverse('course-roster', kwargs={'pk': self.other.pk}),
+            {'students': ['student1'], 'replace': True}, format='json')
+        self.assertEqual(self.poll('assignment-list', since)['deleted'], [self.kept.pk])
+
+
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x', role='student')
+
+    def setUp(self):
+        for alias in ('default', 'local', 'shared'):
+            caches[alias].clear()
+
+    def deactivate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.is_active = False
+            self.student.save()
+
+    def token(self):
+        return str(add_claims(AccessToken.for_user(self.student), self.student))
+
+    async def connect(self, token=None, **headers):
+        url = reverse('course-events')
+        if token is not None:
+            url += f'?token={token}'
+        return await self.async_client.get(url, headers=headers)
+
+    async def read(self, stream):
+        return (await asyncio.wait_for(anext(stream), 5)).decode()
+
+    async def test_token_query_parameter_opens_the_stream(self):
+        response = await self.connect(self.token())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await self.read(stream), 'retry: 3000\n\n')
+            events.get_broker().publish([self.student.pk], 'submission.graded', {'score': 9})
+            event = await self.read(stream)
+            self.assertIn('event: submission.graded\n', event)
+            self.assertIn('data: {"score": 9}', event)
+        finally:
+            await stream.aclose()
+
+    async def test_bearer_header_works_too(self):
+        response = await self.connect(Authorization=f'Bearer {self.token()}')
+        self.assertEqual(response.status_code, 200)
+        await response.streaming_content.aclose()
+
+    async def test_missing_bad_or_stale_tokens_are_rejected(self):
+        self.assertEqual((await self.connect()).status_code, 401)
+        self.assertEqual((await self.connect('not-a-token')).status_code, 401)
+        self.assertEqual((await self.connect(Authorization='Bearer nope')).status_code, 401)
+        token = self.token()
+        response = await self.connect(token)
+        self.assertEqual(response.status_code, 200)
+        await response.streaming_content.aclose()
+        await sync_to_async(self.deactivate)()
+        self.assertEqual((await self.connect(token)).status_code, 401)
+
+    async def test_reconnecting_replays_missed_events(self):
+        broker = events.get_broker()
+        broker.publish([self.student.pk], 'enrollment.added', {'course': 1})
+        seen = broker.history[self.student.pk][-1]['id']
+        broker.publish([self.student.pk], 'enrollment.removed', {'course': 1})
+        response = await self.connect(self.token(), **{'Last-Event-ID': str(seen)})
+        stream = aiter(response.streaming_content)
+        try:
+            await self.read(stream)
+            self.assertIn('event: enrollment.removed\n', await self.read(stream))
+        finally:
+            await stream.aclose()
+
+    def test_wsgi_requests_are_refused(self):
+        response = self.client.get(f"{reverse('course-events')}?token={self.token()}")
+        self.assertEqual(response.status_code, 501)
+
+
+class MyAssignmentsTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = cls.students[0]
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+        cls.course.students.add(cls.student)
+        now = timezone.now()
+
+        def assignment(title, days, course=cls.course):
+            return Assignment.objects.create(course=course, title=title, description='y',
+                                             due_date=now + timedelta(days=days))
+
+        cls.upcoming = assignment('Upcoming', 2)
+        cls.submitted = assignment('Submitted', 1)
+        cls.graded = assignment('Graded', -3)
+        cls.missed = assignment('Missed', -2)
+        cls.forgotten = assignment('Forgotten', -1)
+        assignment('Elsewhere', 1, course=Course.objects.create(
+            title='Other', description='x', instructor=cls.instructor))
+        Submission.objects.create(assignment=cls.submitted, student=cls.student, content='A')
+        Submission.objects.create(assignment=cls.graded, student=cls.student, content='A',
+                                  status='graded', score=7)
+        Submission.objects.create(assignment=cls.missed, student=cls.student, content='',
+                                  status='missing')
+        # Another student's submission does not count.
+        Submission.objects.create(assignment=cls.forgotten, student=cls.students[1], content='A')
+
+    def test_each_assignment_carries_the_students_submission_state(self):
+        response = self.client_for(self.student).get(reverse('my-assignments'))
+        self.assertEqual(response.status_code, 200)
+        rows = [(row['title'], row['status'], row['score'], row['overdue'])
+                for row in response.data['results']]
+        self.assertEqual(rows, [
+            ('Graded', 'graded', 7, False),
+            ('Missed', 'missing', None, True),
+            ('Forgotten', 'pending', None, True),
+            ('Submitted', 'submitted', None, False),
+            ('Upcoming', 'pending', None, False),
+        ])
+        row = response.data['results'][0]
+        self.assertEqual((row['course_title'], row['submission']),
+                         ('Course', Submission.objects.get(assignment=self.graded).pk))
+
+    def test_instructors_have_no_assignments_to_submit(self):
+        response = self.client_for(self.instructor).get(reverse('my-assignments'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_my_assignments_queries_do_not_grow_with_assignments(self):
+        def add_rows():
+            for i in range(10):
+                assignment = Assignment.objects.create(
+                    course=self.course, title=f'More {i}', description='y',
+                    due_date=timezone.now() + timedelta(days=i - 5))
+                if i % 2:
+                    Submission.objects.create(assignment=assignment, student=self.student,
+                                              content='A')
+
+        self.assertConstantQueries(self.client_for(self.student), reverse('my-assignments'),
+                                   add_rows)
+
+
+
+class DeadlineTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(title='Course', description='About it',
+                                           instructor=cls.instructor)
+        cls.course.students.add(*cls.students)
+
+    def setUp(self):
+        super().setUp()
+        self.since = timezone.now() - timedelta(days=1)
+
+    def assignment(self, hours):
+        return Assignment.objects.create(course=self.course, title='Essay', description='y',
+                                         due_date=timezone.now() + timedelta(hours=hours))
+
+    def statuses(self, assignment):
+        return dict(Submission.objects.filter(assignment=assignment)
+                    .values_list('student__username', 'status'))
+
+    def test_late_submissions_are_marked_and_missing_ones_filled_in(self):
+        passed, upcoming = self.assignment(-1), self.assignment(1)
+        on_time = Submission.objects.create(assignment=passed, student=self.students[0],
+                                            content='A')
+        Submission.objects.filter(pk=on_time.pk).update(
+            submitted_at=passed.due_date - timedelta(minutes=5))
+        Submission.objects.create(assignment=passed, student=self.students[1], content='B')
+        Submission.objects.create(assignment=upcoming, student=self.students[1], content='B')
+        self.assertEqual(process_deadlines(self.since), (1, 1))
+        self.assertEqual(self.statuses(passed),
+                         {'student0': 'submitted', 'student1': 'late', 'student2': 'missing'})
+        self.assertEqual(self.statuses(upcoming), {'student1': 'submitted'})
+        # A second run finds nothing left to do.
+        self.assertEqual(process_deadlines(self.since), (0, 0))
+
+    def test_dry_run_counts_without_writing(self):
+        passed = self.assignment(-1)
+        Submission.objects.create(assignment=passed, student=self.students[0], content='A')
+        self.assertEqual(process_deadlines(self.since, dry_run=True), (1, 2))
+        self.assertEqual(self.statuses(passed), {'student0': 'submitted'})
+        out = StringIO()
+        call_command('process_deadlines', '--dry-run', stdout=out)
+        self.assertIn('Would mark 1 submission(s) late and 2 missing', out.getvalue())
+
+    def test_placeholders_are_inserted_in_batches(self):
+        assignments = [self.assignment(-i) for i in range(1, 4)]
+        self.assertEqual(process_deadlines(self.since, batch_size=2), (0, 9))
+        for assignment in assignments:
+            self.assertEqual(set(self.statuses(assignment).values()), {'missing'})
+
+    def test_deadline_queries_do_not_grow_with_assignments(self):
+        def queries(n):
+            # Every run is one window with n assignments due in it.
+            for _ in range(n):
+                self.assignment(-1)
+            with CaptureQueriesContext(connection) as ctx:
+                late, missing = process_deadlines(timezone.now() - timedelta(hours=2))
+            self.assertEqual(missing, n * len(self.students))
+            Submission.objects.all().delete()
+            Assignment.objects.all().delete()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(1), queries(10))
@@ -1,25 +1,37 @@
 from django.urls import path
+from .async_views import read_view
 from .views import (
-    CourseListCreateView, CourseDetailView, EnrollView, MyCourseView,
+    CourseListCreateView, CourseDetailView, EnrollView, RosterView, MyCourseView,
+    SearchView,
     LessonListCreateView, LessonDetailView,
-    AssignmentListCreateView, AssignmentDetailView,
-    SubmissionListCreateView, SubmissionDetailView,
+    AssignmentListCreateView, MyAssignmentsView, AssignmentDetailView,
+    SubmissionListCreateView, SubmissionDetailView, BulkGradeView,
+    GradebookView, CourseAnalyticsView, SubmissionExportView, EventStreamView,
 )
 
 urlpatterns = [
     # Courses
-    path('', CourseListCreateView.as_view(), name='course-list'),
-    path('<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
+    path('', read_view(CourseListCreateView), name='course-list'),
+    path('<int:pk>/', read_view(CourseDetailView), name='course-detail'),
     path('<int:pk>/enroll/', EnrollView.as_view(), name='course-enroll'),
-    path('my/', MyCourseView.as_view(), name='my-courses'),
+    path('<int:pk>/roster/', RosterView.as_view(), name='course-roster'),
+    path('my/', read_view(MyCourseView), name='my-courses'),
+    path('search/', SearchView.as_view(), name='course-search'),
+    path('<int:pk>/gradebook/', GradebookView.as_view(), name='course-gradebook'),
+    path('<int:pk>/analytics/', CourseAnalyticsView.as_view(), name='course-analytics'),
+    path('<int:pk>/submissions/export/', SubmissionExportView.as_view(),
+         name='course-submission-export'),
+    path('events/', EventStreamView.as_view(), name='course-events'),
 
     # Lessons (nested under course)
-    path('<int:course_id>/lessons/', LessonListCreateView.as_view(), name='lesson-list'),
-    path('<int:course_id>/lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
+    path('<int:course_id>/lessons/', read_view(LessonListCreateView), name='lesson-list'),
+    path('<int:course_id>/lessons/<int:pk>/', read_view(LessonDetailView), name='lesson-detail'),
 
     # Assignments & Submissions (flat endpoints as per spec)
-    path('assignments/', AssignmentListCreateView.as_view(), name='assignment-list'),
-    path('assignments/<int:pk>/', AssignmentDetailView.as_view(), name='assignment-detail'),
-    path('submissions/', SubmissionListCreateView.as_view(), name='submission-list'),
-    path('submissions/<int:pk>/', SubmissionDetailView.as_view(), name='submission-detail'),
+    path('assignments/', read_view(AssignmentListCreateView), name='assignment-list'),
+    path('assignments/mine/', read_view(MyAssignmentsView), name='my-assignments'),
+    path('assignments/<int:pk>/', read_view(AssignmentDetailView), name='assignment-detail'),
+    path('submissions/', read_view(SubmissionListCreateView), name='submission-list'),
+    path('submissions/bulk/', BulkGradeView.as_view(), name='submission-bulk-grade'),
+    path('submissions/<int:pk>/', read_view(SubmissionDetailView), name='submission-detail'),
 ]
@@ -1,27 +1,67 @@
+import asyncio
+import csv
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views import View
 from rest_framework import generics, permissions, status
-from rest_framework.views import APIView
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
 
+from accounts.authentication import aauthenticate_request
 from .models import Course, Lesson, Assignment, Submission
 from .serializers import (
     CourseSerializer, CourseListSerializer,
-    LessonSerializer, AssignmentSerializer, SubmissionSerializer
+    LessonSerializer, AssignmentSerializer, MyAssignmentSerializer, SubmissionSerializer,
+    BulkGradeItemSerializer,
 )
 from .permissions import IsInstructorOrReadOnly, IsCourseInstructor, IsInstructor
+from .pagination import (
+    CoursePagination, LessonPagination, AssignmentPagination, SubmissionPagination,
+    GradebookPagination,
+)
+from .gradebook import assignment_stats, grade_rows
+from . import analytics, caching, events, export, search
+from .sync import DeltaSyncMixin, bury_enrollments, left_courses, taught_or_enrolled
+from .fieldsets import SparseFieldsViewMixin
+from .parsers import CSVParser
 
 
 # ── Course Views ────────────────────────────────────────────────────────────
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(caching.CachedReadMixin, SparseFieldsViewMixin, DeltaSyncMixin,
+                           generics.ListCreateAPIView):
     """
-    GET  /api/courses/          - List all published courses
+    GET  /api/courses/          - List all published courses (?since= for changes only)
     POST /api/courses/          - Create a course (instructor only)
     """
     permission_classes = [permissions.IsAuthenticated, IsInstructorOrReadOnly]
+    pagination_class = CoursePagination
+    personal_enrollment = True
+    tombstone_kind = 'course'
+
+    def version_keys(self):
+        return [caching.CATALOG]
+
+    def removed_ids(self, since):
+        unpublished = (Course.objects.filter(is_published=False, updated_at__gt=since)
+                       .values_list('pk', flat=True))
+        return sorted(set(super().removed_ids(since)) | set(unpublished))
 
     def get_queryset(self):
-        return Course.objects.filter(is_published=True).select_related('instructor')
+        return (Course.objects.filter(is_published=True)
+                .select_related('instructor')
+                .with_enrollment(self.request.user))
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -32,66 +72,217 @@ class CourseListCreateView(generics.ListCreateAPIView):
         serializer.save(instructor=self.request.user)
 
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(caching.CachedReadMixin, SparseFieldsViewMixin,
+                       generics.RetrieveUpdateDestroyAPIView):
     """
     GET    /api/courses/<id>/   - Course detail with lessons & assignments
     PUT    /api/courses/<id>/   - Update (instructor only)
     DELETE /api/courses/<id>/   - Delete (instructor only)
     """
-    queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated, IsCourseInstructor]
+    personal_enrollment = True
+
+    def version_keys(self):
+        return [caching.course_key(self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return Course.objects.with_detail(self.request.user)
 
 
 class EnrollView(APIView):
-    """POST /api/courses/<id>/enroll/ - Enroll/unenroll current student"""
+    """
+    PUT    /api/courses/<id>/enroll/ - Enroll current student (idempotent)
+    DELETE /api/courses/<id>/enroll/ - Unenroll current student (idempotent)
+    POST   /api/courses/<id>/enroll/ - Toggle enrollment (kept for older clients)
+    """
     permission_classes = [permissions.IsAuthenticated]
 
-    def post(self, request, pk):
+    def get_course(self, request, pk):
         if request.user.role != 'student':
-            return Response({'detail': 'Only students can enroll.'}, status=403)
-        course = get_object_or_404(Course, pk=pk, is_published=True)
-        if course.students.filter(pk=request.user.pk).exists():
-            course.students.remove(request.user)
+            raise PermissionDenied('Only students can enroll.')
+        return get_object_or_404(Course, pk=pk, is_published=True)
+
+    def changed(self, course, user):
+        # enroll()/unenroll() write the through table directly, without m2m_changed.
+        caching.touch_courses([course.pk])
+        caching.touch_enrollments([user.pk])
+
+    def put(self, request, pk):
+        course = self.get_course(request, pk)
+        if course.enroll(request.user):
+            self.changed(course, request.user)
+            return Response({'detail': 'Successfully enrolled in the course.'})
+        return Response({'detail': 'Already enrolled in the course.'})
+
+    def delete(self, request, pk):
+        course = self.get_course(request, pk)
+        if course.unenroll(request.user):
+            self.changed(course, request.user)
             return Response({'detail': 'Successfully unenrolled from the course.'})
-        course.students.add(request.user)
+        return Response({'detail': 'Not enrolled in the course.'})
+
+    def post(self, request, pk):
+        course = self.get_course(request, pk)
+        if course.unenroll(request.user):
+            self.changed(course, request.user)
+            return Response({'detail': 'Successfully unenrolled from the course.'})
+        course.enroll(request.user)
+        self.changed(course, request.user)
         return Response({'detail': 'Successfully enrolled in the course.'})
 
 
-class MyCourseView(generics.ListAPIView):
+class RosterView(APIView):
+    """
+    POST /api/courses/<id>/roster/ - Bulk-enroll students (course instructor only)
+
+    Accepts usernames or user ids as a JSON list, as
+    {"students": [...], "replace": bool}, or as CSV (first column, either a
+    `text/csv` body or a multipart `file`). With `replace` (or ?replace=1),
+    enrolled students missing from the list are removed.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+    parser_classes = [JSONParser, CSVParser, MultiPartParser]
+
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if course.instructor_id != request.user.pk:
+            raise PermissionDenied('Only the course instructor can manage the roster.')
+
+        entries, replace = self.parse_roster(request)
+        if entries is None:
+            return Response({'detail': 'Expected a list of usernames or ids, or a CSV file.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ids = {int(entry) for entry in entries if entry.isdigit()}
+        found = list(
+            get_user_model().objects
+            .filter(Q(pk__in=ids) | Q(username__in=entries), role='student')
+            .values_list('id', 'username')
+        )
+        user_ids = {user_id for user_id, _ in found}
+        known = {str(user_id) for user_id in user_ids} | {name for _, name in found}
+        not_found = [entry for entry in entries if entry not in known]
+
+        Enrollment = Course.students.through
+        with transaction.atomic():
+            existing = set(Enrollment.objects.filter(course_id=course.pk, user_id__in=user_ids)
+                           .values_list('user_id', flat=True))
+            Enrollment.objects.bulk_create(
+                [Enrollment(course_id=course.pk, user_id=user_id)
+                 for user_id in user_ids - existing],
+                batch_size=500, ignore_conflicts=True,
+            )
+            removed_ids = []
+            if replace:
+                stale = Enrollment.objects.filter(course_id=course.pk).exclude(user_id__in=user_ids)
+                removed_ids = list(stale.values_list('user_id', flat=True))
+                stale.delete()
+                bury_enrollments((course.pk, user_id) for user_id in removed_ids)
+            # Raw through-table writes skip m2m_changed; recount, invalidate
+            # cached reads and record the removals here instead.
+            Course.objects.filter(pk=course.pk).recount('student_count')
+            caching.touch_courses([course.pk])
+            caching.touch_enrollments(list(user_ids - existing) + removed_ids)
+            event = {'course': course.pk, 'course_title': course.title}
+            events.publish(user_ids - existing, 'enrollment.added', event)
+            events.publish(removed_ids, 'enrollment.removed', event)
+
+        course.refresh_from_db(fields=['student_count'])
+        return Response({
+            'added': len(user_ids - existing),
+            'already_enrolled': len(existing),
+            'removed': len(removed_ids),
+            'not_found': not_found,
+            'student_count': course.student_count,
+        })
+
+    def parse_roster(self, request):
+        data = request.data
+        replace = request.query_params.get('replace', '').lower() in ('1', 'true', 'yes')
+        upload = request.FILES.get('file') if hasattr(request, 'FILES') else None
+        if upload is not None:
+            data = upload.read().decode('utf-8-sig')
+        if isinstance(data, dict) and 'students' in data:
+            replace = replace or bool(data.get('replace'))
+            data = data['students']
+        if isinstance(data, str):
+            rows = csv.reader(io.StringIO(data))
+            data = [row[0] for row in rows if row and row[0].strip()]
+            if data and data[0].strip().lower() in ('username', 'id', 'user', 'student'):
+                data = data[1:]
+        if not isinstance(data, list):
+            return None, replace
+        entries = list(dict.fromkeys(str(entry).strip() for entry in data if str(entry).strip()))
+        return entries, replace
+
+
+class MyCourseView(SparseFieldsViewMixin, generics.ListAPIView):
     """GET /api/courses/my/ - Courses for the current user (enrolled or teaching)"""
     serializer_class = CourseListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CoursePagination
 
     def get_queryset(self):
         user = self.request.user
+        courses = Course.objects.select_related('instructor').with_enrollment(user)
         if user.role == 'instructor':
-            return Course.objects.filter(instructor=user)
-        return user.enrolled_courses.filter(is_published=True)
+            return courses.filter(instructor=user)
+        return courses.filter(is_enrolled=True, is_published=True)
+
+
+class SearchView(APIView):
+    """
+    GET /api/courses/search/?q=<text>[&limit=20&offset=0]
+    Ranked full-text search over courses, lessons and assignments the
+    current user can see, with highlighted snippets.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not search.is_supported():
+            return Response({'detail': 'Search is not available on this database.'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), search.MAX_RESULTS)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'detail': 'limit and offset must be integers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'q': q, 'results': search.search(request.user, q, limit, offset)})
 
 
 # ── Lesson Views ─────────────────────────────────────────────────────────────
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonListCreateView(caching.CachedReadMixin, SparseFieldsViewMixin, DeltaSyncMixin,
+                           generics.ListCreateAPIView):
     """
-    GET  /api/courses/<course_id>/lessons/  - List lessons
+    GET  /api/courses/<course_id>/lessons/  - List lessons (?since= for changes only)
     POST /api/courses/<course_id>/lessons/  - Add lesson (instructor only)
     """
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LessonPagination
+    tombstone_kind = 'lesson'
+
+    def version_keys(self):
+        return [caching.lessons_key(self.kwargs['course_id'])]
 
     def get_queryset(self):
         return Lesson.objects.filter(course_id=self.kwargs['course_id'])
 
+    def visible_tombstones(self, tombstones):
+        return tombstones.filter(course_id=self.kwargs['course_id'])
+
     def perform_create(self, serializer):
         course = get_object_or_404(Course, pk=self.kwargs['course_id'])
         if course.instructor != self.request.user:
-            from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only the course instructor can add lessons.')
         serializer.save(course=course)
 
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LessonDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -101,77 +292,364 @@ class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # ── Assignment Views ──────────────────────────────────────────────────────────
 
-class AssignmentListCreateView(generics.ListCreateAPIView):
+class AssignmentListCreateView(SparseFieldsViewMixin, DeltaSyncMixin, generics.ListCreateAPIView):
     """
-    GET  /api/courses/assignments/  - List all assignments
+    GET  /api/courses/assignments/  - List all assignments (?since= for changes only)
     POST /api/courses/assignments/  - Create assignment (instructor only)
     """
     serializer_class = AssignmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AssignmentPagination
+    tombstone_kind = 'assignment'
 
     def get_queryset(self):
         user = self.request.user
+        # `course_title` reads the course row; its description is never needed.
+        assignments = Assignment.objects.select_related('course').defer('course__description')
         if user.role == 'instructor':
-            return Assignment.objects.filter(course__instructor=user)
+            return assignments.filter(course__instructor=user)
         # Students see assignments from enrolled courses only
-        return Assignment.objects.filter(course__students=user)
+        return assignments.filter(course__students=user)
+
+    def visible_tombstones(self, tombstones):
+        return tombstones.filter(taught_or_enrolled(self.request.user))
+
+    def removed_ids(self, since):
+        removed = super().removed_ids(since)
+        user = self.request.user
+        if user.role == 'instructor':
+            return removed
+        # Assignments of courses the student has left drop out of the list.
+        left = Assignment.objects.filter(course_id__in=left_courses(user, since))
+        return sorted(set(removed) | set(left.values_list('pk', flat=True)))
 
     def perform_create(self, serializer):
         course = serializer.validated_data['course']
         if course.instructor != self.request.user:
-            from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only the course instructor can create assignments.')
-        serializer.save()
+        assignment = serializer.save()
+        students = (Course.students.through.objects.filter(course_id=course.pk)
+                    .values_list('user_id', flat=True))
+        events.publish(students, 'assignment.created', {
+            'id': assignment.pk, 'course': course.pk, 'course_title': course.title,
+            'title': assignment.title, 'due_date': assignment.due_date,
+        })
+
+
+class MyAssignmentsView(SparseFieldsViewMixin, generics.ListAPIView):
+    """
+    GET /api/courses/assignments/mine/ - The current student's assignments by
+    due date, each with their submission status, score and `overdue` flag
+    """
+    serializer_class = MyAssignmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AssignmentPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.role != 'student':
+            raise PermissionDenied('Only students have assignments to submit.')
+        return (Assignment.objects.filter(course__students=user)
+                .annotate(course_title=F('course__title'))
+                .with_submission(user))
 
 
-class AssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AssignmentDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AssignmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Assignment.objects.all()
+        return Assignment.objects.select_related('course').defer('course__description')
 
 
 # ── Submission Views ──────────────────────────────────────────────────────────
 
-class SubmissionListCreateView(generics.ListCreateAPIView):
+class SubmissionListCreateView(SparseFieldsViewMixin, DeltaSyncMixin, generics.ListCreateAPIView):
     """
-    GET  /api/courses/submissions/  - List submissions (own, or all if instructor)
+    GET  /api/courses/submissions/  - List submissions (own, or all if instructor;
+                                      ?since= for changes only)
     POST /api/courses/submissions/  - Submit an assignment (student only)
     """
     serializer_class = SubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SubmissionPagination
+    tombstone_kind = 'submission'
 
     def get_queryset(self):
         user = self.request.user
+        # The serializer shows the assignment title and student username.
+        submissions = Submission.objects.select_related('assignment', 'student')
         if user.role == 'instructor':
-            return Submission.objects.filter(assignment__course__instructor=user)
-        return Submission.objects.filter(student=user)
+            return submissions.filter(assignment__course__instructor=user)
+        return submissions.filter(student=user)
+
+    def visible_tombstones(self, tombstones):
+        user = self.request.user
+        if user.role == 'instructor':
+            return tombstones.filter(taught_or_enrolled(user))
+        return tombstones.filter(student_id=user.pk)
 
     def perform_create(self, serializer):
         if self.request.user.role != 'student':
-            from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only students can submit assignments.')
-        serializer.save(student=self.request.user)
+        now = timezone.now()
+        assignment = serializer.validated_data['assignment']
+        state = 'late' if now > assignment.due_date else 'submitted'
+        # Past the deadline process_deadlines may already have left a
+        # 'missing' placeholder; the submission replaces it. One transaction,
+        # so the production profile takes the write lock before the read.
+        with transaction.atomic():
+            placeholder = Submission.objects.filter(
+                assignment=assignment, student=self.request.user, status='missing').first()
+            if placeholder is not None:
+                serializer.instance = placeholder
+                serializer.save(status=state, submitted_at=now)
+            else:
+                serializer.save(student=self.request.user, status=state)
 
 
-class SubmissionDetailView(generics.RetrieveUpdateAPIView):
+class SubmissionDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateAPIView):
     """GET/PATCH /api/courses/submissions/<id>/ - View or grade a submission"""
     serializer_class = SubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
+        # The serializer shows the assignment title and student username.
+        submissions = Submission.objects.select_related('assignment', 'student')
         if user.role == 'instructor':
-            return Submission.objects.filter(assignment__course__instructor=user)
-        return Submission.objects.filter(student=user)
+            return submissions.filter(assignment__course__instructor=user)
+        return submissions.filter(student=user)
 
     def perform_update(self, serializer):
         # Only instructors can grade
         if self.request.user.role == 'instructor':
             if 'score' in self.request.data:
-                serializer.save(status='graded')
+                submission = serializer.save(status='graded')
+                events.publish([submission.student_id], 'submission.graded',
+                               graded_event(submission))
             else:
                 serializer.save()
+        elif serializer.instance.status == 'missing':
+            # Filling in the placeholder is a (late) submission.
+            serializer.save(status='late', submitted_at=timezone.now())
         else:
             serializer.save()
+
+
+def graded_event(submission):
+    return {'id': submission.pk, 'assignment': submission.assignment_id,
+            'score': submission.score, 'status': submission.status}
+
+
+class BulkGradeView(APIView):
+    """
+    PATCH /api/courses/submissions/bulk/ - Grade many submissions at once
+    (instructor only). Body: [{"id", "score", "feedback"?}, ...]
+
+    Valid items are saved together in one transaction and marked `graded`;
+    every item gets an entry in `results`, in request order.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+    max_items = 1000
+
+    def patch(self, request):
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of {id, score, feedback} objects.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_items:
+            return Response({'detail': f'At most {self.max_items} items per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        items = {}
+        for raw in request.data:
+            item = BulkGradeItemSerializer(data=raw)
+            if not item.is_valid():
+                results.append({'id': raw.get('id') if isinstance(raw, dict) else None,
+                                'status': 'error', 'errors': item.errors})
+            elif item.validated_data['id'] in items:
+                results.append({'id': item.validated_data['id'], 'status': 'error',
+                                'errors': {'id': ['Duplicate submission id.']}})
+            else:
+                items[item.validated_data['id']] = item.validated_data
+                results.append({'id': item.validated_data['id'], 'status': None})
+
+        # One ownership-scoped query covers every requested id.
+        submissions = {
+            sub.pk: sub for sub in
+            Submission.objects.filter(pk__in=list(items),
+                                      assignment__course__instructor=request.user)
+            .select_related('assignment')
+            .only('id', 'student', 'score', 'feedback', 'status', 'updated_at',
+                  'assignment__max_score')
+        }
+
+        now = timezone.now()
+        to_update = []
+        for result in results:
+            if result['status'] is not None:
+                continue
+            data = items[result['id']]
+            sub = submissions.get(result['id'])
+            if sub is None:
+                result.update(status='error', errors={'id': ['Submission not found.']})
+            elif data['score'] > sub.assignment.max_score:
+                result.update(status='error', errors={
+                    'score': [f'Ensure this value is less than or equal to '
+                              f'{sub.assignment.max_score}.']})
+            else:
+                sub.score = data['score']
+                if 'feedback' in data:
+                    sub.feedback = data['feedback']
+                sub.status = 'graded'
+                # bulk_update() skips auto_now, so stamp updated_at here.
+                sub.updated_at = now
+                to_update.append(sub)
+                result['status'] = 'updated'
+
+        with transaction.atomic():
+            Submission.objects.bulk_update(
+                to_update, ['score', 'feedback', 'status', 'updated_at'], batch_size=500)
+            for sub in to_update:
+                events.publish([sub.student_id], 'submission.graded', graded_event(sub))
+
+        return Response({'updated': len(to_update), 'results': results})
+
+
+# ── Gradebook ─────────────────────────────────────────────────────────────────
+
+class GradebookView(APIView):
+    """
+    GET /api/courses/<id>/gradebook/ - Student x assignment grade matrix with
+    per-assignment statistics (course instructor only). Student rows are
+    cursor-paginated; `assignments` is returned in full on every page and
+    `grades` cells follow its order.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+
+    def get(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if course.instructor_id != request.user.pk:
+            raise PermissionDenied('Only the course instructor can view the gradebook.')
+
+        assignments = assignment_stats(course)
+        paginator = GradebookPagination()
+        students = paginator.paginate_queryset(
+            course.students.values('id', 'username'), request, view=self)
+        rows = grade_rows(course, students, [a['id'] for a in assignments])
+        return Response({
+            'course': {'id': course.id, 'title': course.title,
+                       'student_count': course.student_count},
+            'assignments': assignments,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': rows,
+        })
+
+
+class CourseAnalyticsView(APIView):
+    """
+    GET /api/courses/<id>/analytics/?days=90 - Enrollment over time,
+    submissions per day, grade distribution and time from due date to
+    submission (course instructor only). Read from the rollups kept by
+    `manage.py refresh_analytics`, so figures are as of `refreshed_at`.
+    Daily series cover the last `days` days, at most `max_days`.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+    max_days = 3650
+
+    def get(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if course.instructor_id != request.user.pk:
+            raise PermissionDenied('Only the course instructor can view course analytics.')
+        try:
+            days = min(max(int(request.query_params.get('days', 90)), 1), self.max_days)
+        except ValueError:
+            return Response({'detail': 'days must be an integer.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        since_date = timezone.localdate() - timedelta(days=days - 1)
+        return Response(analytics.course_analytics(course, since_date))
+
+
+class SubmissionExportView(APIView):
+    """
+    GET /api/courses/<id>/submissions/export/?format=csv|ndjson
+    Stream every submission in the course (course instructor only), from
+    an async iterator under ASGI so the export is not buffered whole.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsInstructor]
+
+    def perform_content_negotiation(self, request, force=False):
+        # `format` picks the export encoding below rather than a DRF renderer;
+        # error responses are always JSON.
+        renderer = JSONRenderer()
+        return (renderer, renderer.media_type)
+
+    def get(self, request, pk):
+        fmt = request.query_params.get('format', 'csv')
+        if fmt not in export.FORMATS:
+            return Response({'format': f'Expected one of: {", ".join(export.FORMATS)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        course = get_object_or_404(Course, pk=pk)
+        if course.instructor_id != request.user.pk:
+            raise PermissionDenied('Only the course instructor can export submissions.')
+
+        if isinstance(request._request, ASGIRequest):
+            content = export.aencode(export.aexport_rows(course), fmt)
+        else:
+            content = export.encode(export.export_rows(course), fmt)
+        response = StreamingHttpResponse(content, content_type=export.FORMATS[fmt][0])
+        response['Content-Disposition'] = (
+            f'attachment; filename="course-{course.pk}-submissions.{fmt}"')
+        return response
+
+
+# ── Events ────────────────────────────────────────────────────────────────────
+
+class EventStreamView(View):
+    """
+    GET /api/courses/events/ - Server-sent events for the current user:
+    submission.graded, assignment.created, enrollment.added/removed.
+
+    Takes the usual `Authorization: Bearer` header or, because browsers'
+    EventSource cannot set headers, the access token as ?token=. Streams
+    end after `max_age` seconds; clients reconnect with Last-Event-ID and
+    get whatever they missed. Needs an ASGI server (backend/asgi.py).
+    """
+    heartbeat = 15
+    max_age = 300
+
+    async def get(self, request):
+        user = await aauthenticate_request(request, request.GET.get('token'))
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                status=401)
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'detail': 'The event stream needs an ASGI server.'},
+                                status=501)
+        last_id = request.headers.get('Last-Event-ID', '')
+        subscription = events.get_broker().subscribe(
+            user.pk, int(last_id) if last_id.isdigit() else None)
+        response = StreamingHttpResponse(self.stream(subscription),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, subscription):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_age
+        try:
+            yield 'retry: 3000\n\n'
+            for event in subscription.backlog:
+                yield events.format_event(event)
+            while loop.time() < deadline:
+                try:
+                    event = await subscription.get(self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield events.format_event(event)
+        finally:
+            subscription.close()
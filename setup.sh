@@ -13,6 +13,7 @@ echo "🗄️  Running migrations..."
 python manage.py makemigrations accounts
 python manage.py makemigrations courses
 python manage.py migrate
+python manage.py createcachetable
 
 # Create superuser (optional)
 echo ""